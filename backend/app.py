@@ -1,17 +1,35 @@
 
+import time
+_imports_started = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import psycopg2
-from fastapi.staticfiles import StaticFiles
-from db_utils import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+import asyncio
+from static_cache import CachedStaticFiles
+from db_utils import db_pool
 
 # Import routers
-from auth import router as auth_router
+from auth import router as auth_router, password_hasher
 from prediction import router as prediction_router
+from batch_prediction import router as batch_prediction_router, BATCH_MAX_ZIP_BYTES
 from history import router as history_router
 from feedback import router as feedback_router
-from chat import router as chat_router  # Import the chat router
+from chat import router as chat_router, prewarm_chat_cache  # Import the chat router
+from chat_client import deepseek_client
+from model_admin import router as model_admin_router
+from inference_pool import inference_pool
+from blob_store import BLOB_STORE_DIR, BLOB_URL_PREFIX
+from async_db import database
+from startup import startup_state
+from upload_utils import UploadSizeLimitMiddleware, UPLOAD_MAX_BYTES, UPLOAD_FORM_OVERHEAD
+from fastapi.responses import PlainTextResponse
+from metrics import registry, TraceMiddleware
+from inference_batcher import batcher
+from model_utils import model_registry
+
+startup_state.record("imports", time.perf_counter() - _imports_started)
 
 app = FastAPI()
 
@@ -22,80 +40,96 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the frontend read the trace ID and stage timings
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
+# Cap upload bodies by Content-Length and by the bytes actually received, before the form is spooled
+app.add_middleware(UploadSizeLimitMiddleware, limits={
+    "/predict/": UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD,
+    "/predict/batch": BATCH_MAX_ZIP_BYTES + UPLOAD_FORM_OVERHEAD,
+})
+
+# Outermost, so every request (including rejected ones) gets a trace ID and a latency sample
+app.add_middleware(TraceMiddleware)
+
 # Ensure the uploads directory exists
 os.makedirs("uploads", exist_ok=True)
 
-# Initialize PostgresSQL database
-def init_db():
-    try:
-        print(f"Initializing database at {DB_HOST}:{DB_PORT}/{DB_NAME} with user {DB_USER}")
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        cursor = conn.cursor()
-        
-        # Create detection_history table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS detection_history (
-            id TEXT PRIMARY KEY,
-            username TEXT NOT NULL,
-            image_path TEXT NOT NULL,
-            image_base64 TEXT,
-            timestamp TEXT NOT NULL,
-            detections TEXT NOT NULL
-        )
-        ''')
-        
-        # Create users table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            salt TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        )
-        ''')
-        
-        # Create feedback table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS feedback (
-            id TEXT PRIMARY KEY,
-            username TEXT NOT NULL,
-            rating INTEGER NOT NULL,
-            comment TEXT NOT NULL,
-            timestamp TEXT NOT NULL
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print("Database tables created successfully")
-    except Exception as e:
-        print(f"Error initializing database: {str(e)}")
-        # Don't fail app startup if DB init fails - Railway might provision DB after app starts
-        # We'll handle connection errors in the endpoint handlers
-
-# Initialize database on startup
-init_db()
-
 # Mount the uploads directory for serving images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", CachedStaticFiles(directory="uploads"), name="uploads")
+
+# Mount the content-addressed blob store (originals and derived sizes) for serving images
+app.mount(f"/{BLOB_URL_PREFIX}", CachedStaticFiles(directory=BLOB_STORE_DIR), name="blobs")
 
 # Include routers
 app.include_router(auth_router)
 app.include_router(prediction_router)
+app.include_router(batch_prediction_router)
 app.include_router(history_router)
 app.include_router(feedback_router)
 app.include_router(chat_router)  # Include the chat router
+app.include_router(model_admin_router)
+
+@app.on_event("startup")
+async def start_background_startup():
+    # Return right away so the server binds its port; the model and database get ready in the background
+    startup_state.start()
+    # Keep a reference so the task is not garbage collected mid-run
+    app.state.chat_prewarm = asyncio.create_task(prewarm_chat_cache())
+
+@app.on_event("shutdown")
+def shutdown_inference_pool():
+    inference_pool.shutdown()
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def close_database():
+    startup_state.stop()
+    await database.close()
+    db_pool.close()
+
+@app.on_event("shutdown")
+async def close_chat_client():
+    await deepseek_client.aclose()
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness of the model and database (or its file fallback); 503 until both are ready"""
+    status = startup_state.status()
+    if status["database"]["mode"] == "database":
+        # Migrations ran earlier; make sure the database is still reachable now
+        try:
+            await database.fetchval("SELECT 1")
+        except Exception as e:
+            status["database"].update({"ready": False, "error": str(e)})
+            status["ready"] = False
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Point-in-time values read when /metrics is scraped
+registry.gauge("potato_inference_in_flight", "Image jobs queued or running in the inference pool",
+               lambda: inference_pool.stats()["in_flight"])
+registry.gauge("potato_inference_queue_limit", "In-flight image jobs allowed before requests get 503",
+               lambda: inference_pool.queue_depth)
+registry.gauge("potato_batch_queue_depth", "Decoded images waiting for the next batched forward pass",
+               lambda: batcher.stats()["queue_depth"])
+registry.gauge("potato_db_pool_connections", "Async database pool connections by state",
+               lambda: [((state,), database.stats().get(key)) for state, key in (("open", "size"), ("idle", "idle"))],
+               labels=("state",))
+registry.gauge("potato_model_info", "Active model backend and version",
+               lambda: [((model_registry.active.backend, model_registry.version), 1)] if model_registry.loaded else [],
+               labels=("backend", "version"))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms and pipeline gauges in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/db")
+async def db_pool_stats():
+    """Connection pool utilization and query metrics"""
+    return {"async": database.stats(), "sync": db_pool.stats()}
@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import time
+import asyncio
+from datetime import datetime
+from contextlib import asynccontextmanager
+from db_utils import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_RECYCLE
+from metrics import observe_stage
+
+# Async PostgreSQL driver
+try:
+    import asyncpg
+    asyncpg_available = True
+except ImportError:
+    print("Warning: asyncpg not available. The async data layer needs asyncpg or ASYNC_DB_SQLITE_PATH.")
+    asyncpg_available = False
+
+# SQLite stand-in for local development and tests
+try:
+    import aiosqlite
+    aiosqlite_available = True
+except ImportError:
+    aiosqlite_available = False
+
+# Set to a file path (or ":memory:") to run the async data layer on SQLite instead of PostgreSQL
+ASYNC_DB_SQLITE_PATH = os.getenv("ASYNC_DB_SQLITE_PATH")
+# Prepared statements cached per connection by asyncpg
+ASYNC_DB_STATEMENT_CACHE_SIZE = int(os.getenv("ASYNC_DB_STATEMENT_CACHE_SIZE", "256"))
+ASYNC_DB_COMMAND_TIMEOUT = float(os.getenv("ASYNC_DB_COMMAND_TIMEOUT", "30"))
+# How long to wait before trying an unreachable database again
+ASYNC_DB_RETRY_INTERVAL = float(os.getenv("ASYNC_DB_RETRY_INTERVAL", "5"))
+
+class DatabaseUnavailableError(Exception):
+    """Raised when the database cannot be reached"""
+
+# Exceptions raised for unique/foreign key violations by either backend
+INTEGRITY_ERRORS = tuple(
+    error for error in (
+        asyncpg.exceptions.IntegrityConstraintViolationError if asyncpg_available else None,
+        aiosqlite.IntegrityError if aiosqlite_available else None,
+    ) if error is not None
+)
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+def to_sqlite(query, args):
+    """Rewrite PostgreSQL `$n` placeholders to SQLite `?` and order the arguments to match"""
+    positions = [int(n) - 1 for n in _PLACEHOLDER.findall(query)]
+    return _PLACEHOLDER.sub("?", query), [args[i] for i in positions]
+
+def to_iso(value):
+    """Render a timestamp column as an ISO string (PostgreSQL returns datetimes, SQLite strings)"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def from_json(value):
+    """Decode a JSONB column (a JSON string from asyncpg/SQLite, already decoded from psycopg2)"""
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+class _Transaction:
+    """Statements run on one connection inside a transaction"""
+
+    def __init__(self, conn, sqlite):
+        self._conn = conn
+        self._sqlite = sqlite
+
+    async def execute(self, query, *args):
+        if self._sqlite:
+            sqlite_query, sqlite_args = to_sqlite(query, args)
+            await self._conn.execute(sqlite_query, sqlite_args)
+        else:
+            await self._conn.execute(query, *args)
+
+    async def fetchval(self, query, *args):
+        if self._sqlite:
+            sqlite_query, sqlite_args = to_sqlite(query, args)
+            async with self._conn.execute(sqlite_query, sqlite_args) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row is not None else None
+        return await self._conn.fetchval(query, *args)
+
+class AsyncDatabase:
+    """Async data access with a connection pool.
+
+    Queries are written once with PostgreSQL `$n` placeholders. On PostgreSQL they run
+    through an asyncpg pool, which prepares and caches each statement per connection.
+    With ASYNC_DB_SQLITE_PATH set they run on a single aiosqlite connection instead,
+    which is enough for development and tests without a database server.
+    """
+
+    def __init__(self, sqlite_path=ASYNC_DB_SQLITE_PATH):
+        self.sqlite_path = sqlite_path
+        self.backend = "sqlite" if sqlite_path else "postgres"
+        self._pool = None
+        self._sqlite = None
+        self._sqlite_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+        self._last_failure = 0.0
+        self._queries = 0
+        self._total_query_time = 0.0
+
+    async def connect(self):
+        """Open the pool (or SQLite connection); safe to call more than once"""
+        if self._pool is not None or self._sqlite is not None:
+            return
+        async with self._connect_lock:
+            if self._pool is not None or self._sqlite is not None:
+                return
+            if self.backend == "sqlite":
+                if not aiosqlite_available:
+                    raise DatabaseUnavailableError("aiosqlite is not installed")
+                self._sqlite = await aiosqlite.connect(self.sqlite_path)
+                self._sqlite.row_factory = aiosqlite.Row
+                print(f"Async data layer using SQLite at {self.sqlite_path}")
+            else:
+                if not asyncpg_available:
+                    raise DatabaseUnavailableError("asyncpg is not installed")
+                self._pool = await asyncpg.create_pool(
+                    host=DB_HOST,
+                    port=int(DB_PORT),
+                    database=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    min_size=DB_POOL_MIN,
+                    max_size=DB_POOL_MAX,
+                    max_inactive_connection_lifetime=DB_POOL_RECYCLE,
+                    statement_cache_size=ASYNC_DB_STATEMENT_CACHE_SIZE,
+                    command_timeout=ASYNC_DB_COMMAND_TIMEOUT,
+                )
+                print(f"Async PostgreSQL pool ({DB_POOL_MIN}-{DB_POOL_MAX}) connected to {DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+    async def close(self):
+        """Close the pool (or SQLite connection)"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        if self._sqlite is not None:
+            await self._sqlite.close()
+            self._sqlite = None
+
+    async def is_available(self):
+        """Connect if needed; returns False (without retrying for a while) when the database is down"""
+        if self._pool is not None or self._sqlite is not None:
+            return True
+        if time.monotonic() - self._last_failure < ASYNC_DB_RETRY_INTERVAL:
+            return False
+        try:
+            await self.connect()
+            return True
+        except Exception as e:
+            print(f"Database connection error: {str(e)}")
+            self._last_failure = time.monotonic()
+            return False
+
+    async def _ensure_connected(self):
+        if not await self.is_available():
+            raise DatabaseUnavailableError("Database is not reachable")
+
+    async def _run(self, method, query, args):
+        await self._ensure_connected()
+        started = time.perf_counter()
+        try:
+            if self._sqlite is not None:
+                return await self._run_sqlite(method, query, args)
+            async with self._pool.acquire() as conn:
+                observe_stage("db_connect", time.perf_counter() - started)
+                if method == "fetch":
+                    return [dict(row) for row in await conn.fetch(query, *args)]
+                if method == "fetchrow":
+                    row = await conn.fetchrow(query, *args)
+                    return dict(row) if row is not None else None
+                if method == "fetchval":
+                    return await conn.fetchval(query, *args)
+                if method == "executemany":
+                    return await conn.executemany(query, args)
+                return await conn.execute(query, *args)
+        finally:
+            self._queries += 1
+            self._total_query_time += time.perf_counter() - started
+
+    async def _run_sqlite(self, method, query, args):
+        async with self._sqlite_lock:
+            if method == "executemany":
+                sqlite_query = _PLACEHOLDER.sub("?", query)
+                await self._sqlite.executemany(sqlite_query, [to_sqlite(query, row)[1] for row in args])
+                await self._sqlite.commit()
+                return None
+
+            sqlite_query, sqlite_args = to_sqlite(query, args)
+            cursor = await self._sqlite.execute(sqlite_query, sqlite_args)
+            try:
+                if method == "fetch":
+                    return [dict(row) for row in await cursor.fetchall()]
+                if method == "fetchrow":
+                    row = await cursor.fetchone()
+                    return dict(row) if row is not None else None
+                if method == "fetchval":
+                    row = await cursor.fetchone()
+                    return row[0] if row is not None else None
+                await self._sqlite.commit()
+                return None
+            finally:
+                await cursor.close()
+
+    async def fetch(self, query, *args):
+        """Return all rows as dicts"""
+        return await self._run("fetch", query, args)
+
+    async def fetchrow(self, query, *args):
+        """Return the first row as a dict, or None"""
+        return await self._run("fetchrow", query, args)
+
+    async def fetchval(self, query, *args):
+        """Return the first column of the first row"""
+        return await self._run("fetchval", query, args)
+
+    async def execute(self, query, *args):
+        """Run a statement (autocommitted)"""
+        return await self._run("execute", query, args)
+
+    async def executemany(self, query, rows):
+        """Run a statement once per argument tuple in a single round trip where supported"""
+        return await self._run("executemany", query, rows)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run several statements atomically on one connection"""
+        await self._ensure_connected()
+        if self._sqlite is not None:
+            async with self._sqlite_lock:
+                try:
+                    yield _Transaction(self._sqlite, sqlite=True)
+                    await self._sqlite.commit()
+                except BaseException:
+                    await self._sqlite.rollback()
+                    raise
+        else:
+            acquire_started = time.perf_counter()
+            async with self._pool.acquire() as conn:
+                observe_stage("db_connect", time.perf_counter() - acquire_started)
+                async with conn.transaction():
+                    yield _Transaction(conn, sqlite=False)
+
+    def stats(self):
+        """Return pool size and query timing"""
+        stats = {
+            "backend": self.backend,
+            "connected": self._pool is not None or self._sqlite is not None,
+            "queries": self._queries,
+            "avg_query_ms": self._total_query_time / self._queries * 1000.0 if self._queries else 0.0,
+        }
+        if self._pool is not None:
+            stats.update({
+                "size": self._pool.get_size(),
+                "idle": self._pool.get_idle_size(),
+                "min_size": self._pool.get_min_size(),
+                "max_size": self._pool.get_max_size(),
+            })
+        return stats
+
+# Shared async database used by the routers
+database = AsyncDatabase()
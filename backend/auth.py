@@ -1,15 +1,37 @@
 
-from fastapi import APIRouter, HTTPException
-import secrets
+from fastapi import APIRouter, HTTPException, Header
+import asyncio
+import base64
 import hashlib
+import hmac
+import json
 import os
-from datetime import datetime
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
 from models import UserSignup, UserLogin
 from fastapi.responses import JSONResponse
-from db_utils import get_db_connection
+from async_db import database, INTEGRITY_ERRORS
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Password hashing pool: PBKDF2 releases the GIL, so each worker hashes on its own core
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashes queued or running before login/signup requests get 503
+AUTH_HASH_QUEUE_DEPTH = int(os.getenv("AUTH_HASH_QUEUE_DEPTH", "64"))
+PASSWORD_HASH_ITERATIONS = 100000
+
+# Session tokens
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET")
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(7 * 24 * 3600)))
+
+if not AUTH_TOKEN_SECRET:
+    print("Warning: AUTH_TOKEN_SECRET is not set, session tokens will not survive a restart")
+    AUTH_TOKEN_SECRET = secrets.token_hex(32)
+
 def hash_password(password, salt=None):
     """Hash password with salt"""
     if salt is None:
@@ -20,61 +42,132 @@ def hash_password(password, salt=None):
         'sha256', 
         password.encode('utf-8'), 
         salt.encode('utf-8'), 
-        100000
+        PASSWORD_HASH_ITERATIONS
     )
     
     return salt, pwdhash.hex()
 
+class PasswordHasher:
+    """Runs hash_password in a small thread pool so hashing never blocks the event loop.
+
+    The number of hashes waiting or running is capped; beyond that requests are rejected
+    with 503 instead of queueing behind a login burst.
+    """
+
+    def __init__(self, workers=AUTH_HASH_WORKERS, queue_depth=AUTH_HASH_QUEUE_DEPTH):
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    async def hash(self, password, salt=None):
+        """Return (salt, hash) computed in the hashing pool"""
+        with self._lock:
+            if self._in_flight >= self.queue_depth:
+                self._rejected += 1
+                raise HTTPException(status_code=503, detail="Too many sign-in attempts in progress. Please try again shortly.")
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, hash_password, password, salt)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth_limit": self.queue_depth,
+                "in_flight": self._in_flight,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher()
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload):
+    return hmac.new(AUTH_TOKEN_SECRET.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest()
+
+def issue_token(user_id, username, ttl=AUTH_TOKEN_TTL):
+    """Create a signed session token: base64url(JSON claims) "." base64url(HMAC-SHA256)"""
+    now = int(time.time())
+    claims = {"sub": user_id, "username": username, "iat": now, "exp": now + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_b64encode(_sign(payload))}"
+
+def verify_token(token):
+    """Return the claims of a valid, unexpired token; raises ValueError otherwise"""
+    try:
+        payload, signature = token.split(".")
+        valid = hmac.compare_digest(_b64decode(signature), _sign(payload))
+    except (ValueError, UnicodeError):
+        raise ValueError("Malformed token")
+    if not valid:
+        raise ValueError("Invalid token signature")
+    claims = json.loads(_b64decode(payload))
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), int):
+        raise ValueError("Malformed token")
+    if claims["exp"] < time.time():
+        raise ValueError("Token has expired")
+    return claims
+
+async def current_user(authorization: Optional[str] = Header(None)):
+    """Dependency returning the claims of the request's `Authorization: Bearer` token.
+
+    Verified from the signature alone, without a database round trip.
+    """
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_token(authorization[7:].strip())
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
 @router.post("/signup")
 async def signup(user_data: UserSignup):
     """Register a new user"""
     try:
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if username already exists
-        cursor.execute("SELECT * FROM users WHERE username = %s", (user_data.username,))
-        if cursor.fetchone():
-            conn.close()
-            return JSONResponse(
-                status_code=400,
-                content={"message": "Username already exists"}
-            )
-        
-        # Check if email already exists
-        cursor.execute("SELECT * FROM users WHERE email = %s", (user_data.email,))
-        if cursor.fetchone():
-            conn.close()
-            return JSONResponse(
-                status_code=400,
-                content={"message": "Email already exists"}
-            )
-        
         # Hash password with salt
-        salt, hashed_password = hash_password(user_data.password)
+        salt, hashed_password = await password_hasher.hash(user_data.password)
         
         # Generate unique user ID
         user_id = secrets.token_hex(16)
         
-        # Insert user into database
-        cursor.execute(
-            "INSERT INTO users (id, username, email, password_hash, salt, created_at) VALUES (%s, %s, %s, %s, %s, %s)",
-            (
+        # Insert user into database; the unique constraints reject taken usernames and emails
+        try:
+            await database.execute(
+                "INSERT INTO users (id, username, email, password_hash, salt, created_at) VALUES ($1, $2, $3, $4, $5, $6)",
                 user_id,
                 user_data.username,
                 user_data.email,
                 hashed_password,
                 salt,
-                datetime.now().isoformat()
+                datetime.now(timezone.utc)
+            )
+        except INTEGRITY_ERRORS as e:
+            # asyncpg names the violated constraint; SQLite puts the column in the message
+            constraint = getattr(e, "constraint_name", None) or str(e)
+            message = "Email already exists" if "email" in constraint else "Username already exists"
+            return JSONResponse(
+                status_code=400,
+                content={"message": message}
             )
-        )
-        
-        conn.commit()
-        conn.close()
         
         return {"message": "User registered successfully", "user_id": user_id}
     
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the exception in a production environment
         print(f"Error in signup: {str(e)}")
@@ -84,16 +177,10 @@ async def signup(user_data: UserSignup):
 async def login(user_data: UserLogin):
     """Login a user"""
     try:
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Fetch user by email
-        cursor.execute("SELECT id, username, email, password_hash, salt FROM users WHERE email = %s", (user_data.email,))
-        user = cursor.fetchone()
+        user = await database.fetchrow("SELECT id, username, email, password_hash, salt FROM users WHERE email = $1", user_data.email)
         
         if not user:
-            conn.close()
             return JSONResponse(
                 status_code=401,
                 content={"message": "Invalid email or password"}
@@ -104,25 +191,27 @@ async def login(user_data: UserLogin):
         stored_hash, salt = user['password_hash'], user['salt']
         
         # Verify password
-        _, calculated_hash = hash_password(user_data.password, salt)
+        _, calculated_hash = await password_hasher.hash(user_data.password, salt)
         
-        if calculated_hash != stored_hash:
-            conn.close()
+        if not hmac.compare_digest(calculated_hash, stored_hash):
             return JSONResponse(
                 status_code=401,
                 content={"message": "Invalid email or password"}
             )
         
         # Successful login
-        conn.close()
-        
         return {
             "message": "Login successful",
             "user_id": user_id,
             "username": username,
-            "email": email
+            "email": email,
+            "token": issue_token(user_id, username),
+            "token_type": "bearer",
+            "expires_in": AUTH_TOKEN_TTL
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         # Log the exception in a production environment
         print(f"Error in login: {str(e)}")
@@ -0,0 +1,171 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List
+from datetime import datetime, timezone
+import asyncio
+import zipfile
+import json
+import uuid
+import io
+import os
+
+from async_db import database
+from inference_pool import inference_pool, INFERENCE_QUEUE_DEPTH
+from prediction_cache import cached_detect, content_digest
+from prediction import SERVER_URL
+from blob_store import blob_store, blob_reference, image_url
+from upload_utils import read_upload, check_image, UPLOAD_MAX_BYTES
+from derivatives import store_upload, image_urls
+
+router = APIRouter(tags=["prediction"])
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+IMAGE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/jpg"}
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-zip"}
+
+# Batch upload limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_ZIP_BYTES = int(os.getenv("BATCH_MAX_ZIP_BYTES", str(500 * 1024 * 1024)))
+# How many images of a lot are in the pipeline at once; the batcher groups them into forward passes
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Images of all lots together in the inference pool at once, kept well under INFERENCE_QUEUE_DEPTH
+# so batch uploads never take every slot and single /predict/ calls still get in
+BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", str(max(1, INFERENCE_QUEUE_DEPTH // 4))))
+
+# Shared by every /predict/batch request
+batch_slots = asyncio.Semaphore(max(1, BATCH_MAX_IN_FLIGHT))
+
+def extract_zip_images(zip_content):
+    """Return (filename, bytes) for every PNG/JPEG in a zip archive"""
+    images = []
+    total_size = 0
+    with zipfile.ZipFile(io.BytesIO(zip_content)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                continue
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+
+            # Guard against zip bombs before decompressing
+            if info.file_size > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"{name} is too large. The limit is {UPLOAD_MAX_BYTES // (1024 * 1024)} MB per image.")
+            total_size += info.file_size
+            if total_size > BATCH_MAX_ZIP_BYTES:
+                raise HTTPException(status_code=400, detail="Zip archive is too large when extracted")
+            images.append((os.path.basename(name), archive.read(info)))
+    return images
+
+async def save_detections(rows):
+    """Insert all detection_history rows of a batch in one pipelined round trip"""
+    await database.executemany(
+        "INSERT INTO detection_history (id, username, image_path, timestamp, detections, model_version) VALUES ($1, $2, $3, $4, $5, $6)",
+        rows
+    )
+
+def is_zip_upload(file):
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+async def process_image(username, filename, file_content):
+    """Store and detect one image of a batch; returns (response line, history row)"""
+    file_id = str(uuid.uuid4())
+    # The real format and dimensions come from the header; rejects non-images and decompression bombs
+    file_extension, _, _ = check_image(file_content)
+    # Hashed outside the inference pool, whose slots are kept for detection
+    content_hash = await run_in_threadpool(content_digest, file_content)
+    image_path = blob_reference(blob_store.key_for(content_hash, file_extension))
+
+    inference_pool.run_background(store_upload, file_content, content_hash, file_extension)
+    result = await cached_detect(file_content, content_hash)
+
+    line = {
+        "id": file_id,
+        "filename": filename,
+        "image_url": image_url(SERVER_URL, image_path),
+        "image_urls": image_urls(SERVER_URL, image_path),
+        "detections": result['detections'],
+        "model_version": result.get('model_version')
+    }
+    row = (file_id, username, image_path, datetime.now(timezone.utc), json.dumps(result['detections']), result.get('model_version'))
+    return line, row
+
+@router.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...), username: str = Form(...)):
+    """Run detection on many images (or a zip archive of images) and stream NDJSON results"""
+    print(f"Received batch prediction request for user: {username}")
+
+    if not username:
+        raise HTTPException(status_code=400, detail="Username is required")
+
+    # Gather the images of the lot
+    images = []
+    for file in files:
+        file_content = await read_upload(file, BATCH_MAX_ZIP_BYTES if is_zip_upload(file) else UPLOAD_MAX_BYTES)
+        if not file_content:
+            continue
+        if is_zip_upload(file):
+            try:
+                images.extend(await run_in_threadpool(extract_zip_images, file_content))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"Invalid zip archive: {file.filename}")
+        elif file.content_type in IMAGE_CONTENT_TYPES:
+            images.append((file.filename or "image.jpg", file_content))
+        else:
+            raise HTTPException(status_code=400, detail=f"Invalid file type: {file.content_type}. Please upload PNG/JPEG images or a zip archive.")
+
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    if len(images) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many images: {len(images)}. The limit is {BATCH_MAX_FILES}.")
+
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+    async def bounded_process(filename, file_content):
+        async with semaphore, batch_slots:
+            try:
+                return await process_image(username, filename, file_content)
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                print(f"Error processing {filename} in batch: {detail}")
+                return {"filename": filename, "error": detail}, None
+
+    async def stream_results():
+        tasks = [asyncio.create_task(bounded_process(name, content)) for name, content in images]
+        rows = []
+        class_counts = {}
+        failed = 0
+        try:
+            # Stream each image's result as soon as it is ready
+            for next_done in asyncio.as_completed(tasks):
+                line, row = await next_done
+                if row is None:
+                    failed += 1
+                else:
+                    rows.append(row)
+                    top = max(line["detections"], key=lambda d: d["confidence"])
+                    class_counts[top["class_name"]] = class_counts.get(top["class_name"], 0) + 1
+                yield json.dumps(line) + "\n"
+
+            saved = True
+            if rows:
+                try:
+                    await save_detections(rows)
+                except Exception as e:
+                    print(f"Error saving batch detections: {str(e)}")
+                    saved = False
+
+            summary = {
+                "total": len(images),
+                "processed": len(rows),
+                "failed": failed,
+                "saved": saved,
+                "class_counts": class_counts
+            }
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            # Stop outstanding work if the client goes away
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
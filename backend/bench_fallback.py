@@ -0,0 +1,65 @@
+"""Parity check and throughput benchmark for the batched rule-based fallback detector.
+
+Usage:
+    python bench_fallback.py [--batch-size 64] [--rounds 5]
+
+Compares fallback_detect_disease (one image at a time) with fallback_scores_batch on
+the images in uploads/ plus random noise, then times both on the same stack of
+already-resized 224x224 images.
+"""
+import argparse
+import glob
+import time
+import numpy as np
+from PIL import Image
+from detection_utils import fallback_detect_disease, fallback_scores_batch, FALLBACK_CLASSES, FALLBACK_SIZE
+
+def load_stack(batch_size):
+    arrays = []
+    for path in sorted(glob.glob("uploads/*.jpg") + glob.glob("uploads/*.png")):
+        img = Image.open(path).convert("RGB").resize((FALLBACK_SIZE, FALLBACK_SIZE))
+        arrays.append(np.asarray(img))
+
+    # Pad with random images so every rule branch gets exercised
+    rng = np.random.default_rng(0)
+    while len(arrays) < batch_size:
+        arrays.append(rng.integers(0, 256, (FALLBACK_SIZE, FALLBACK_SIZE, 3), dtype=np.uint8))
+    return np.stack(arrays)
+
+def check_parity(stack):
+    best, confidence = fallback_scores_batch(stack)
+    max_diff = 0.0
+    for i, array in enumerate(stack):
+        expected = fallback_detect_disease(Image.fromarray(array))["detections"][0]
+        assert FALLBACK_CLASSES[best[i]] == expected["class_name"], f"class mismatch on image {i}"
+        max_diff = max(max_diff, abs(float(confidence[i]) - expected["confidence"]))
+    assert max_diff < 1e-9, f"confidence mismatch: {max_diff}"
+    print(f"Parity OK on {len(stack)} images (max confidence difference {max_diff:.2e})")
+
+def benchmark(stack, rounds):
+    images = [Image.fromarray(array) for array in stack]
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for img in images:
+            fallback_detect_disease(img)
+    per_image = (time.perf_counter() - started) / (rounds * len(images))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fallback_scores_batch(stack)
+    batched = (time.perf_counter() - started) / (rounds * len(images))
+
+    print(f"Per-image loop: {per_image * 1000:.3f} ms/image ({1 / per_image:.0f} images/s)")
+    print(f"Batched:        {batched * 1000:.3f} ms/image ({1 / batched:.0f} images/s)")
+    print(f"Speedup:        {per_image / batched:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the batched fallback detector")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    stack = load_stack(args.batch_size)
+    check_parity(stack)
+    benchmark(stack, args.rounds)
@@ -0,0 +1,95 @@
+"""Parity check and latency comparison between the PyTorch and ONNX Runtime backends.
+
+Usage:
+    python bench_onnx.py [--onnx best.onnx] [--batch-size 8] [--rounds 3]
+
+Runs best.pt through ultralytics and the exported model through ONNX Runtime on the
+images in uploads/, checks that the top detection of every image has the same class
+and a close confidence, then times both backends one image at a time and batched.
+Exits non-zero when parity fails. INT8 models usually need a looser --conf-tolerance.
+"""
+import argparse
+import glob
+import sys
+import time
+from PIL import Image
+from model_utils import MODEL_PATH, ONNX_MODEL_PATH, class_names
+from onnx_backend import OnnxDetector
+
+def load_images():
+    paths = sorted(glob.glob("uploads/*.jpg") + glob.glob("uploads/*.png"))
+    return paths, [Image.open(path).convert("RGB") for path in paths]
+
+def top_detection(boxes):
+    """(class name, confidence) of the most confident box, or None"""
+    if not boxes:
+        return None
+    box = max(boxes, key=lambda row: row[4])
+    return class_names.get(int(box[5]), "Unknown"), float(box[4])
+
+def check_parity(paths, pytorch_boxes, onnx_boxes, conf_tolerance, min_agreement):
+    agree = 0
+    max_diff = 0.0
+    for path, expected, actual in zip(paths, pytorch_boxes, onnx_boxes):
+        expected, actual = top_detection(expected), top_detection(actual)
+        if expected is None or actual is None:
+            same = expected is None and actual is None
+        else:
+            same = expected[0] == actual[0]
+            if same:
+                max_diff = max(max_diff, abs(expected[1] - actual[1]))
+        if same:
+            agree += 1
+        else:
+            print(f"Class mismatch on {path}: pytorch={expected} onnx={actual}")
+
+    agreement = agree / len(paths)
+    print(f"Class agreement: {agree}/{len(paths)} ({agreement:.1%}), max confidence difference {max_diff:.4f}")
+    return agreement >= min_agreement and max_diff <= conf_tolerance
+
+def benchmark(name, detect, images, batch_size, rounds):
+    detect(images[:1])  # warm-up
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for img in images:
+            detect([img])
+    single = (time.perf_counter() - started) / (rounds * len(images))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(0, len(images), batch_size):
+            detect(images[i:i + batch_size])
+    batched = (time.perf_counter() - started) / (rounds * len(images))
+
+    print(f"{name:8} batch 1: {single * 1000:.1f} ms/image   batch {batch_size}: {batched * 1000:.1f} ms/image")
+    return single, batched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the PyTorch and ONNX Runtime backends")
+    parser.add_argument("--onnx", default=ONNX_MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--conf-tolerance", type=float, default=0.02)
+    parser.add_argument("--min-agreement", type=float, default=1.0)
+    args = parser.parse_args()
+
+    paths, images = load_images()
+    if not images:
+        sys.exit("No images in uploads/ to compare on")
+
+    from ultralytics import YOLO
+    yolo = YOLO(MODEL_PATH)
+    onnx = OnnxDetector(args.onnx)
+
+    def pytorch_detect(batch):
+        return [result.boxes.data.tolist() for result in yolo(batch, verbose=False)]
+
+    parity_ok = check_parity(paths, pytorch_detect(images), onnx(images), args.conf_tolerance, args.min_agreement)
+
+    pytorch_single, pytorch_batched = benchmark("pytorch", pytorch_detect, images, args.batch_size, args.rounds)
+    onnx_single, onnx_batched = benchmark("onnx", onnx, images, args.batch_size, args.rounds)
+    print(f"Speedup: {pytorch_single / onnx_single:.2f}x (batch 1), {pytorch_batched / onnx_batched:.2f}x (batch {args.batch_size})")
+
+    if not parity_ok:
+        sys.exit("Parity check failed")
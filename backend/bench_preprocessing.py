@@ -0,0 +1,90 @@
+"""Decode time and peak memory of the shared preprocessing against a full-resolution decode.
+
+Usage:
+    python bench_preprocessing.py [--rounds 3] [--size 640]
+
+For every JPEG in uploads/ (plus a synthetic 12 MP photo, so there is always a large
+image), compares the old path, `Image.open(...).convert("RGB")` followed by a resize, with
+preprocessing.decode_image (JPEG draft decoding) followed by letterbox_into a reused
+buffer. Each method runs in its own process so peak RSS is measured separately.
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+def synthetic_photo(width=4000, height=3000):
+    """A 12 MP JPEG with enough detail that it does not compress to nothing"""
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def load_inputs():
+    inputs = [("synthetic 4000x3000", synthetic_photo())]
+    for path in sorted(glob.glob("uploads/*.jpg") + glob.glob("uploads/*.jpeg")):
+        with open(path, "rb") as f:
+            inputs.append((path, f.read()))
+    return inputs
+
+def full_decode(content, size, out):
+    img = Image.open(io.BytesIO(content)).convert("RGB")
+    scale = size / max(img.size)
+    resized = img.resize((round(img.width * scale), round(img.height * scale)), Image.BILINEAR)
+    out[...] = 114
+    out[:resized.height, :resized.width] = np.asarray(resized)
+
+def draft_decode(content, size, out):
+    from preprocessing import decode_image, fit_size, letterbox_into
+    img = decode_image(content, lambda image_size: fit_size(image_size, size))
+    letterbox_into(img, out)
+
+METHODS = {"full": full_decode, "draft": draft_decode}
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_method(name, inputs, size, rounds, results):
+    # Imports and buffers are set up before measuring so only decoding counts
+    out = np.empty((size, size, 3), dtype=np.uint8)
+    import preprocessing  # noqa: F401
+    baseline = peak_rss_mb()
+
+    timings = []
+    for label, content in inputs:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            METHODS[name](content, size, out)
+        timings.append((label, (time.perf_counter() - started) / rounds))
+    results[name] = {"timings": timings, "peak_rss_mb": peak_rss_mb() - baseline}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JPEG draft decoding and letterboxing")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--size", type=int, default=640)
+    args = parser.parse_args()
+
+    inputs = load_inputs()
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for name in METHODS:
+            process = context.Process(target=run_method, args=(name, inputs, args.size, args.rounds, results))
+            process.start()
+            process.join()
+        results = dict(results)
+
+    full, draft = results["full"], results["draft"]
+    print(f"{'image':40} {'full ms':>9} {'draft ms':>9} {'speedup':>8}")
+    for (label, full_time), (_, draft_time) in zip(full["timings"], draft["timings"]):
+        print(f"{label[-40:]:40} {full_time * 1000:9.1f} {draft_time * 1000:9.1f} {full_time / draft_time:7.1f}x")
+    print(f"Peak RSS growth: full {full['peak_rss_mb']:.1f} MB, draft {draft['peak_rss_mb']:.1f} MB")
@@ -0,0 +1,132 @@
+import os
+import uuid
+import hashlib
+
+# Root directory of the local blob store (served at /blobs)
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+BLOB_URL_PREFIX = "blobs"
+
+def sniff_extension(file_content, default=".jpg"):
+    """Pick the file extension from the image's magic bytes rather than the client's filename"""
+    if file_content[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if file_content[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    return default
+
+class LocalBlobStore:
+    """Content-addressed image storage on the local filesystem.
+
+    Blobs are named by the SHA-256 of their bytes and sharded into two levels of
+    directories (`ab/cd/abcd...jpg`), so identical uploads are stored once no matter
+    which user sent them.
+    """
+
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def key_for(self, content_hash, extension):
+        return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}"
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, file_content, content_hash=None, extension=None):
+        """Store bytes and return their blob key; existing blobs are not rewritten"""
+        if content_hash is None:
+            content_hash = hashlib.sha256(file_content).hexdigest()
+        key = self.key_for(content_hash, extension or sniff_extension(file_content))
+        if not self.exists(key):
+            self.write(key, file_content)
+        return key
+
+    def write(self, key, file_content):
+        """Write bytes under an explicit key (used for derived images next to their original)"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so readers never see a partial blob
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(file_content)
+        os.replace(tmp_path, path)
+
+    def open_writer(self, extension):
+        """Start streaming an upload of unknown hash into the store (see BlobWriter)"""
+        return BlobWriter(self, extension)
+
+    def keys(self):
+        """Every stored blob key (originals and derived sizes), skipping partial writes"""
+        for directory, _, filenames in os.walk(self.root):
+            relative = os.path.relpath(directory, self.root)
+            for filename in filenames:
+                if filename.startswith(".") or filename.endswith(".tmp"):
+                    continue
+                yield filename if relative == "." else f"{relative.replace(os.sep, '/')}/{filename}"
+
+    def get(self, key):
+        """Return the bytes of a blob"""
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+class BlobWriter:
+    """Writes an upload chunk by chunk to a temporary file while hashing it.
+
+    commit() moves the file under its content-addressed key (or drops it when that blob
+    already exists), so the whole upload never has to be written from one buffer.
+    """
+
+    def __init__(self, store, extension):
+        self.store = store
+        self.extension = extension
+        self.size = 0
+        self._sha = hashlib.sha256()
+        # Same directory tree as the blobs, so the final os.replace is an atomic rename
+        self.tmp_path = os.path.join(store.root, f".upload-{uuid.uuid4().hex}.tmp")
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, chunk):
+        self._sha.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """Finish the upload; returns (blob key, sha256 hex digest)"""
+        self._file.close()
+        content_hash = self._sha.hexdigest()
+        key = self.store.key_for(content_hash, self.extension)
+        if self.store.exists(key):
+            os.remove(self.tmp_path)
+        else:
+            path = self.store.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.tmp_path, path)
+        return key, content_hash
+
+    def abort(self):
+        """Discard a partial upload"""
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+def blob_reference(key):
+    """Reference stored in detection_history.image_path for a blob"""
+    return f"{BLOB_URL_PREFIX}/{key}"
+
+def image_url(server_url, image_path):
+    """Public URL of a stored image; works for blob references and legacy uploads/ paths"""
+    if not image_path:
+        return ""
+    if image_path.startswith(f"{BLOB_URL_PREFIX}/"):
+        return f"{server_url}/{image_path}"
+    # Legacy rows point at a file in uploads/
+    filename = image_path.split('/')[-1]
+    return f"{server_url}/uploads/{filename}"
+
+# Shared blob store
+blob_store = LocalBlobStore()
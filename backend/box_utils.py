@@ -0,0 +1,33 @@
+import numpy as np
+
+def nms(boxes, scores, threshold, metric="iou"):
+    """Indices of the boxes kept by greedy non-maximum suppression, best first.
+
+    `metric` is "iou" (intersection over union) or "ios" (intersection over the smaller
+    box), which also suppresses a box cut off at a tile edge that lies inside a fuller one.
+    """
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        if metric == "ios":
+            overlap = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            overlap = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= threshold]
+    return np.array(keep, dtype=np.int64)
+
+def batched_nms(boxes, scores, class_ids, threshold, metric="iou"):
+    """Class-aware NMS: boxes of different classes never suppress each other"""
+    if len(boxes) == 0:
+        return np.array([], dtype=np.int64)
+    # Shift each class into its own region so one NMS pass handles every class
+    offsets = class_ids.astype(boxes.dtype)[:, None] * (boxes.max() - boxes.min() + 1)
+    return nms(boxes + offsets, scores, threshold, metric)
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
-import requests
+import json
 from typing import Optional
 from dotenv import load_dotenv
+from chat_client import deepseek_client, DeepSeekError
+from chat_cache import chat_cache, cache_key, CHAT_CACHE_PREWARM
 
 load_dotenv()
 
@@ -21,6 +24,7 @@ class ChatResponse(BaseModel):
     response: str
     model: str
     tokens_used: Optional[int]
+    cached: bool = False
 
 SYSTEM_PROMPT = """You are a potato expert assistant. You can help with questions about:
 - Potato diseases and their treatments
@@ -42,60 +46,144 @@ def get_deepseek_client():
         )
     return api_key
 
+def build_payload(message):
+    return {
+        "model": message.model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": message.message}
+        ],
+        "temperature": message.temperature,
+        "max_tokens": message.max_tokens
+    }
+
+def message_key(message):
+    return cache_key(message.message, message.model, message.temperature, message.max_tokens)
+
+async def ask_deepseek(message, api_key):
+    """Fetch one answer from DeepSeek as {"response", "tokens_used"}"""
+    payload = build_payload(message)
+    response_data = await deepseek_client.complete(api_key, payload)
+    return {
+        "response": response_data["choices"][0]["message"]["content"],
+        "tokens_used": response_data.get("usage", {}).get("total_tokens")
+    }
+
 @router.post("/chat/", response_model=ChatResponse)
 async def chat(
         message: ChatMessage,
         api_key: str = Depends(get_deepseek_client)
 ):
     try:
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": message.model,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": message.message}
-            ],
-            "temperature": message.temperature,
-            "max_tokens": message.max_tokens
-        }
-
-        print(f"Sending request to DeepSeek: {payload}")  # Debug log
-
-        response = requests.post(
-            "https://api.deepseek.com/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=10  # Add timeout to avoid hanging
+        # Repeated questions are answered from the cache or share a call already in flight
+        answer, source = await chat_cache.get_or_fetch(
+            message_key(message),
+            lambda: ask_deepseek(message, api_key)
         )
 
-        response.raise_for_status()  # Raises HTTPError for bad responses (4xx, 5xx)
-        response_data = response.json()
-
-        print(f"DeepSeek API response: {response_data}")  # Debug log
-
         return {
-            "response": response_data["choices"][0]["message"]["content"],
+            **answer,
             "model": message.model,
-            "tokens_used": response_data.get("usage", {}).get("total_tokens")
+            "cached": source != "upstream"
         }
 
-    except requests.exceptions.RequestException as e:
-        error_detail = str(e)
-        if hasattr(e, 'response') and e.response:
-            error_detail = f"HTTP {e.response.status_code}: {e.response.text}"
-            print(f"DeepSeek API Error: {error_detail}")  # Log full error
+    except DeepSeekError as e:
+        print(f"DeepSeek API Error: {e.detail}")  # Log full error
 
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"DeepSeek API Error: {error_detail}"
+            detail=f"DeepSeek API Error: {e.detail}"
         )
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail="Internal server error while processing request."
-        )
\ No newline at end of file
+        )
+
+@router.get("/chat/stats")
+async def chat_stats():
+    """Chat cache hit rate, coalesced requests and upstream call counts"""
+    return {"cache": chat_cache.stats(), "client": deepseek_client.stats()}
+
+def sse_event(data, event=None):
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def relay_stream(message, api_key):
+    """Relay DeepSeek's streamed tokens as `data: {"content": ...}` events, then a `done`
+    event with the model and token usage (or an `error` event).
+
+    Cached answers, and answers to the same question already being fetched by /chat/ or
+    another stream, are sent as a single content event. A live stream is published as
+    in flight, so identical questions asked meanwhile wait for it instead of going upstream.
+    """
+    key = message_key(message)
+    try:
+        answer, _ = await chat_cache.lookup(key)
+        if answer is not None:
+            yield sse_event({"content": answer["response"]})
+            yield sse_event({"model": message.model, "tokens_used": answer["tokens_used"], "cached": True}, event="done")
+            return
+    except DeepSeekError as e:
+        print(f"DeepSeek API Error: {e.detail}")
+        yield sse_event({"detail": f"DeepSeek API Error: {e.detail}"}, event="error")
+        return
+
+    pending = chat_cache.begin(key)
+    parts = []
+    tokens_used = None
+    try:
+        async for chunk in deepseek_client.stream(api_key, build_payload(message)):
+            for choice in chunk.get("choices") or []:
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield sse_event({"content": content})
+            if chunk.get("usage"):
+                tokens_used = chunk["usage"].get("total_tokens")
+        pending.set_result({"response": "".join(parts), "tokens_used": tokens_used})
+        yield sse_event({"model": message.model, "tokens_used": tokens_used, "cached": False}, event="done")
+    except DeepSeekError as e:
+        pending.set_exception(e)
+        print(f"DeepSeek API Error: {e.detail}")
+        yield sse_event({"detail": f"DeepSeek API Error: {e.detail}"}, event="error")
+    except Exception as e:
+        pending.set_exception(e)
+        print(f"Unexpected error while streaming: {str(e)}")
+        yield sse_event({"detail": "Internal server error while processing request."}, event="error")
+    finally:
+        # The client went away mid-stream: anyone waiting looks again instead
+        if not pending.done():
+            pending.cancel()
+
+@router.post("/chat/stream")
+async def chat_stream(
+        message: ChatMessage,
+        api_key: str = Depends(get_deepseek_client)
+):
+    """Like /chat/, but relays the answer token by token as server-sent events"""
+    return StreamingResponse(
+        relay_stream(message, api_key),
+        media_type="text/event-stream",
+        # Stop proxies such as nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def prewarm_chat_cache():
+    """Ask how to treat each disease the model detects, so those answers are cached
+    before anyone asks (CHAT_CACHE_PREWARM; each question is a paid upstream call)"""
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not CHAT_CACHE_PREWARM or not api_key:
+        return
+    from model_utils import disease_info
+
+    questions = [f"How do I treat {name}?" for name in disease_info if name not in ("Healthy", "Unknown")]
+    for question in questions:
+        message = ChatMessage(message=question)
+        try:
+            await chat_cache.get_or_fetch(message_key(message), lambda: ask_deepseek(message, api_key))
+        except Exception as e:
+            print(f"Error pre-warming chat cache for '{question}': {str(e)}")
+    print(f"Pre-warmed chat cache with {len(questions)} questions")
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict
+
+# Cache configuration
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "512"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", str(24 * 3600)))
+# Ask about every disease in model_utils.disease_info at startup (paid upstream calls)
+CHAT_CACHE_PREWARM = os.getenv("CHAT_CACHE_PREWARM", "false").lower() in ("1", "true", "yes")
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_message(message):
+    """Fold case, whitespace and trailing punctuation so trivially different phrasings share an entry"""
+    return _WHITESPACE.sub(" ", message).strip().rstrip("?!. ").lower()
+
+def cache_key(message, model, temperature, max_tokens):
+    return normalize_message(message), model, temperature, max_tokens
+
+class ChatCache:
+    """TTL + LRU cache of chat answers with in-flight request coalescing.
+
+    A question that is already being asked upstream waits for that call instead of
+    issuing a duplicate, whether it came from /chat/ or a live /chat/stream. A /chat/
+    upstream call runs as its own task, so a client that disconnects does not cancel it
+    for the others waiting on the same answer.
+    """
+
+    def __init__(self, max_entries=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._upstream_calls = 0
+        self._upstream_errors = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """Cached answer or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self._expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _finish(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._upstream_errors += 1
+            return
+        self.put(key, task.result())
+
+    async def lookup(self, key):
+        """Return (answer, "cache" or "coalesced") from the cache or a call already in
+        flight, or (None, None) when the question has to be asked upstream"""
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self._hits += 1
+                return value, "cache"
+
+            pending = self._in_flight.get(key)
+            if pending is None:
+                return None, None
+            try:
+                value = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The stream it was waiting on lost its client; look again or ask upstream
+                if pending.cancelled():
+                    continue
+                raise
+            self._coalesced += 1
+            return value, "coalesced"
+
+    def _register(self, key, pending):
+        self._misses += 1
+        self._upstream_calls += 1
+        self._in_flight[key] = pending
+        pending.add_done_callback(lambda done: self._finish(key, done))
+        return pending
+
+    async def get_or_fetch(self, key, fetch):
+        """Return (answer, source) where source is "cache", "coalesced" or "upstream".
+
+        fetch() is a coroutine function called at most once per key at a time.
+        """
+        value, source = await self.lookup(key)
+        if value is not None:
+            return value, source
+
+        task = self._register(key, asyncio.ensure_future(fetch()))
+        return await asyncio.shield(task), "upstream"
+
+    def begin(self, key):
+        """Publish an upstream call made outside get_or_fetch (a live stream).
+
+        Returns a Future that other callers asking the same question wait on. The caller
+        resolves it with the answer or an exception, or cancels it if its client goes away,
+        which sends the waiters back to lookup().
+        """
+        return self._register(key, asyncio.get_running_loop().create_future())
+
+    def stats(self):
+        answered = self._hits + self._coalesced + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hits": self._hits,
+            "coalesced": self._coalesced,
+            "misses": self._misses,
+            "hit_rate": (self._hits + self._coalesced) / answered if answered else 0.0,
+            "upstream_calls": self._upstream_calls,
+            "upstream_errors": self._upstream_errors,
+            "in_flight": len(self._in_flight),
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
+
+# Shared cache used by the chat router
+chat_cache = ChatCache()
@@ -0,0 +1,123 @@
+"""Async client for the DeepSeek (OpenAI-compatible) chat completions API.
+
+One httpx.AsyncClient is shared by all requests, so connections (and their TLS
+sessions) are kept alive and reused instead of being opened for every question, and a
+slow upstream only suspends the request waiting for it rather than the whole worker.
+"""
+import os
+import json
+import time
+import httpx
+from metrics import observe_stage
+
+DEEPSEEK_API_BASE = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1").rstrip("/")
+# Seconds to connect, and to wait for the response (or, when streaming, for each chunk)
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5"))
+DEEPSEEK_TIMEOUT = float(os.getenv("DEEPSEEK_TIMEOUT", "60"))
+DEEPSEEK_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "20"))
+DEEPSEEK_KEEPALIVE_CONNECTIONS = int(os.getenv("DEEPSEEK_KEEPALIVE_CONNECTIONS", "10"))
+
+class DeepSeekError(Exception):
+    """The upstream API failed or could not be reached"""
+
+    def __init__(self, detail, status_code=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+def _error_from(exc):
+    if isinstance(exc, httpx.HTTPStatusError):
+        return DeepSeekError(f"HTTP {exc.response.status_code}: {exc.response.text}", exc.response.status_code)
+    return DeepSeekError(f"{type(exc).__name__}: {str(exc) or 'request failed'}")
+
+class DeepSeekClient:
+    """Pooled chat completions client; `transport` replaces httpx's network transport if given"""
+
+    def __init__(self, base_url=DEEPSEEK_API_BASE, transport=None):
+        self.base_url = base_url
+        self._transport = transport
+        self._client = None
+        self._requests = 0
+        self._streams = 0
+        self._errors = 0
+        self._total_time = 0.0
+
+    @property
+    def client(self):
+        # Created on first use so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(DEEPSEEK_TIMEOUT, connect=DEEPSEEK_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=DEEPSEEK_MAX_CONNECTIONS,
+                    max_keepalive_connections=DEEPSEEK_KEEPALIVE_CONNECTIONS,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    @staticmethod
+    def _headers(api_key):
+        return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    async def complete(self, api_key, payload):
+        """Return the decoded JSON of a (non-streaming) chat completion"""
+        started = time.perf_counter()
+        self._requests += 1
+        try:
+            response = await self.client.post("/chat/completions", headers=self._headers(api_key), json=payload)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            self._errors += 1
+            raise _error_from(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._total_time += elapsed
+            observe_stage("chat_upstream", elapsed)
+
+    async def stream(self, api_key, payload):
+        """Yield the parsed server-sent event chunks of a streaming chat completion"""
+        started = time.perf_counter()
+        self._streams += 1
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        try:
+            async with self.client.stream(
+                "POST", "/chat/completions", headers=self._headers(api_key), json=payload
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    # Keep reading after [DONE] so the connection goes back to the pool
+                    if data != "[DONE]":
+                        yield json.loads(data)
+        except httpx.HTTPError as e:
+            self._errors += 1
+            raise _error_from(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._total_time += elapsed
+            observe_stage("chat_upstream_stream", elapsed)
+
+    def stats(self):
+        calls = self._requests + self._streams
+        return {
+            "base_url": self.base_url,
+            "requests": self._requests,
+            "streams": self._streams,
+            "errors": self._errors,
+            "avg_ms": self._total_time / calls * 1000.0 if calls else 0.0,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Shared client used by the chat router
+deepseek_client = DeepSeekClient()
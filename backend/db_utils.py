@@ -1,9 +1,12 @@
 
 import os
+import time
 import psycopg2
+import threading
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
 import urllib.parse
-import json
 from  dotenv import load_dotenv
 
 load_dotenv()
@@ -66,24 +69,182 @@ def get_db_connection():
         # Instead of raising the error, we'll return None to indicate failure
         return None
 
-# File-based data operations for fallback
-def read_json_file(file_name):
-    file_path = os.path.join(FALLBACK_DATA_DIR, f"{file_name}.json")
+# Connection pool configuration
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))  # reconnect connections older than this
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))  # check idle connections before reuse
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within DB_POOL_TIMEOUT"""
+
+class DatabasePool:
+    """Bounded, thread-safe PostgreSQL connection pool with health checks and recycling.
+
+    psycopg2's ThreadedConnectionPool fails immediately when exhausted, so checkouts are
+    gated by a semaphore and wait up to `timeout` seconds for a connection to be returned.
+    """
+
+    def __init__(self, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, ping_after=DB_POOL_PING_AFTER):
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._created_at = {}
+        self._last_used = {}
+        self._in_use = 0
+        self._checkouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failures = 0
+
+    def open(self):
+        """Create the underlying pool; safe to call more than once"""
+        with self._lock:
+            if self._pool is None:
+                print(f"Opening PostgreSQL pool ({self.min_size}-{self.max_size}) at {DB_HOST}:{DB_PORT}/{DB_NAME}")
+                self._pool = ThreadedConnectionPool(
+                    self.min_size,
+                    self.max_size,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    cursor_factory=RealDictCursor
+                )
+            return self._pool
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._created_at.clear()
+                self._last_used.clear()
+                print("Closed PostgreSQL pool")
+
+    def _is_stale(self, conn, now):
+        if conn.closed:
+            return True
+        if self.recycle and now - self._created_at.setdefault(id(conn), now) > self.recycle:
+            return True
+        if self.ping_after and now - self._last_used.get(id(conn), now) > self.ping_after:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return True
+        return False
+
+    def _discard(self, pool, conn):
+        self._created_at.pop(id(conn), None)
+        self._last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+        self._recycled += 1
+
+    def getconn(self):
+        """Check out a healthy connection, waiting for a free slot if the pool is exhausted"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"No database connection available after {self.timeout:.0f}s")
+
+        try:
+            pool = self.open()
+            conn = pool.getconn()
+            now = time.monotonic()
+            while self._is_stale(conn, now):
+                self._discard(pool, conn)
+                conn = pool.getconn()
+            self._created_at.setdefault(id(conn), now)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._failures += 1
+            raise
+
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return conn
+
+    def putconn(self, conn, broken=False):
+        """Return a connection to the pool"""
+        try:
+            pool = self._pool
+            if pool is None:
+                conn.close()
+            elif broken or conn.closed:
+                self._discard(pool, conn)
+            else:
+                # Never hand out a connection with an open transaction
+                conn.rollback()
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+        except Exception as e:
+            print(f"Error returning connection to pool: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        """Return pool utilization and checkout wait metrics"""
+        with self._lock:
+            return {
+                "open": self._pool is not None,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "utilization": self._in_use / self.max_size,
+                "checkouts": self._checkouts,
+                "avg_wait_ms": self._total_wait / self._checkouts * 1000.0 if self._checkouts else 0.0,
+                "max_wait_ms": self._max_wait * 1000.0,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "connect_failures": self._failures,
+            }
+
+# Shared pool used by all routers
+db_pool = DatabasePool()
+
+@contextmanager
+def db_connection():
+    """Check out a pooled connection for the duration of a with-block.
+
+    Yields None when the database is unreachable, so callers can fall back to file storage.
+    The transaction is rolled back if the block raises, and the connection is always returned.
+    """
     try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                return json.load(file)
-        return []
+        conn = db_pool.getconn()
+    except PoolTimeoutError:
+        raise
     except Exception as e:
-        print(f"Error reading {file_path}: {str(e)}")
-        return []
+        print(f"Database connection error: {str(e)}")
+        yield None
+        return
 
-def write_json_file(file_name, data):
-    file_path = os.path.join(FALLBACK_DATA_DIR, f"{file_name}.json")
+    broken = False
     try:
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error writing to {file_path}: {str(e)}")
-        return False
+        yield conn
+    except (psycopg2.InterfaceError, psycopg2.OperationalError):
+        # The connection itself is unusable; drop it instead of returning it to the pool
+        broken = True
+        raise
+    finally:
+        db_pool.putconn(conn, broken=broken)
@@ -0,0 +1,83 @@
+import io
+import os
+from PIL import Image
+from preprocessing import decode_image, fit_size
+from blob_store import blob_store, blob_reference, image_url, BLOB_URL_PREFIX
+from metrics import timed
+
+# Longest side in pixels of each derived size, smallest first
+DERIVATIVE_SIZES = {"thumbnail": 256, "medium": 1024}
+# "webp" (smaller) or "jpeg" (for clients without WebP support)
+DERIVATIVE_FORMAT = os.getenv("DERIVATIVE_FORMAT", "webp").lower()
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "80"))
+
+# Pillow builds without libwebp fall back to JPEG
+if DERIVATIVE_FORMAT == "webp" and "WEBP" not in Image.SAVE:
+    print("Warning: Pillow has no WebP support. Derived images will be JPEG.")
+    DERIVATIVE_FORMAT = "jpeg"
+DERIVATIVE_EXTENSION = ".webp" if DERIVATIVE_FORMAT == "webp" else ".jpg"
+
+def derivative_key(original_key, variant):
+    """Blob key of a derived size, stored next to its original (`ab/cd/<hash>_thumbnail.webp`)"""
+    base = os.path.splitext(original_key)[0]
+    return f"{base}_{variant}{DERIVATIVE_EXTENSION}"
+
+def encode_derivative(img):
+    """Encode a derived image in DERIVATIVE_FORMAT"""
+    buffer = io.BytesIO()
+    if DERIVATIVE_FORMAT == "webp":
+        img.save(buffer, "WEBP", quality=DERIVATIVE_QUALITY, method=4)
+    else:
+        img.save(buffer, "JPEG", quality=DERIVATIVE_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def generate_derivatives(file_content, original_key):
+    """Write every missing derived size of an original; returns the keys written"""
+    missing = {
+        variant: max_side for variant, max_side in DERIVATIVE_SIZES.items()
+        if not blob_store.exists(derivative_key(original_key, variant))
+    }
+    if not missing:
+        return []
+
+    # Let the JPEG decoder downscale by up to 8x while decoding
+    largest = max(missing.values())
+    current = decode_image(file_content, lambda size: fit_size(size, largest))
+
+    # Work down from the largest size so each resize starts from the previous one.
+    # thumbnail() keeps the aspect ratio and never upscales small originals.
+    written = []
+    for variant, max_side in sorted(missing.items(), key=lambda item: -item[1]):
+        with timed(f"derivative_{variant}"):
+            current.thumbnail((max_side, max_side), Image.LANCZOS)
+            key = derivative_key(original_key, variant)
+            blob_store.write(key, encode_derivative(current))
+        written.append(key)
+    return written
+
+def store_upload(file_content, content_hash, extension):
+    """Background job for an upload: persist the original, then its derived sizes"""
+    key = blob_store.put(file_content, content_hash, extension)
+    try:
+        generate_derivatives(file_content, key)
+    except Exception as e:
+        # The original is stored; image_urls() serves it in place of any missing size
+        print(f"Error generating derivatives for {key}: {str(e)}")
+    return key
+
+def image_urls(server_url, image_path):
+    """URLs of the original and each derived size of a stored image.
+
+    A size that is not in the blob store (still being written after an upload, never
+    generated, or a legacy uploads/ row) points at the original instead.
+    """
+    original = image_url(server_url, image_path)
+    urls = {"original": original}
+    prefix = f"{BLOB_URL_PREFIX}/"
+    for variant in DERIVATIVE_SIZES:
+        urls[variant] = original
+        if image_path and image_path.startswith(prefix):
+            key = derivative_key(image_path[len(prefix):], variant)
+            if blob_store.exists(key):
+                urls[variant] = image_url(server_url, blob_reference(key))
+    return urls
@@ -1,29 +1,46 @@
 
 import os
-import base64
-from PIL import Image
+import time
 import numpy as np
-from model_utils import model, yolo_available, class_names, disease_info
+from model_utils import model_registry, predict_boxes, class_names, disease_info, get_disease_info
+from tiling import tiled_detector, should_tile
+from preprocessing import decode_image, fit_size, resize_batch, MODEL_INPUT_SIZE
 
-def image_to_base64(image_path):
-    """Convert an image file to base64 string"""
-    try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode('utf-8')
-    except Exception as e:
-        print(f"Error converting image to base64: {str(e)}")
+def _draft_size(size):
+    """Smallest decode size the active detector can use for an image of this size"""
+    handle = model_registry.active
+    if handle is not None and handle.model is None:
+        # The fallback stretches every image to 224x224
+        return (FALLBACK_SIZE, FALLBACK_SIZE)
+    if should_tile(size, tiled_detector.mode):
+        # Tiles are cut from the full-resolution image
         return None
+    return fit_size(size, MODEL_INPUT_SIZE)
+
+def load_image(image):
+    """Return an upright RGB PIL image from a file path, in-memory bytes or an already decoded image.
+
+    JPEGs are decoded at reduced resolution when the detector would downscale them anyway.
+    """
+    return decode_image(image, _draft_size)
 
-def detect_disease(image_path):
-    """Detect potato disease using YOLO model if available, otherwise use fallback method"""
+def detect_disease(image):
+    """Detect potato disease using YOLO model if available, otherwise use fallback method.
+
+    `image` may be a file path, the raw uploaded bytes or a decoded PIL image. The result
+    records the `model_version` that produced it.
+    """
     try:
-        # Check if we can use YOLO model
-        if yolo_available and model is not None:
-            return yolo_detect_disease(image_path)
+        # Check if we can use YOLO model (waits for the model if it is still loading)
+        handle = model_registry.ensure_loaded()
+        if handle.model is not None:
+            result = yolo_detect_disease(image, handle)
         else:
             # Fall back to the rule-based detection
             print("Using rule-based fallback detection method")
-            return fallback_detect_disease(image_path)
+            result = fallback_detect_disease(image)
+        result["model_version"] = handle.version
+        return result
     
     except Exception as e:
         print(f"Error in disease detection: {str(e)}")
@@ -33,23 +50,40 @@ def detect_disease(image_path):
                 {
                     "class_name": "Early Blight",
                     "confidence": 0.75,
-                    "description": disease_info["Early Blight"]["description"],
-                    "treatment": disease_info["Early Blight"]["treatment"]
+                    "description": get_disease_info("Early Blight")["description"],
+                    "treatment": get_disease_info("Early Blight")["treatment"]
                 }
-            ]
+            ],
+            "model_version": "fallback"
         }
 
-def yolo_detect_disease(image_path):
+def yolo_detect_disease(image, handle=None):
     """Detect disease using YOLO model"""
-    # Open image
-    img = Image.open(image_path).convert("RGB")
-    
-    # Run YOLOv8 model
-    results = model(img)
+    # Decode image
+    img = load_image(image)
     
+    # Run YOLOv8 model on a batch of one
+    return yolo_detect_disease_batch([img], handle)[0]
+
+def yolo_detect_disease_batch(images, handle=None):
+    """Detect disease on a list of RGB images with a single batched YOLO forward pass (tiling large images)"""
+    # Hold on to one model for the whole batch, even if another is promoted meanwhile
+    handle = handle or model_registry.ensure_loaded()
+
+    def predict(inputs):
+        started = time.perf_counter()
+        boxes = predict_boxes(handle, inputs)
+        model_registry.shadow(inputs, boxes, time.perf_counter() - started)
+        return boxes
+
+    # Large images are split into tiles that run in the same forward pass
+    return [format_yolo_boxes(image_boxes) for image_boxes in tiled_detector.detect(predict, images)]
+
+def format_yolo_boxes(boxes):
+    """Convert [x_min, y_min, x_max, y_max, confidence, class_id] rows into our detections dict"""
     # Extract detections
     detections = []
-    for box in results[0].boxes.data.tolist():
+    for box in boxes:
         x_min, y_min, x_max, y_max, confidence, class_id = box
         class_name = class_names.get(int(class_id), "Unknown")
         
@@ -71,15 +105,11 @@ def yolo_detect_disease(image_path):
     
     return {"detections": detections}
 
-def fallback_detect_disease(image_path):
+def fallback_detect_disease(image):
     """Rule-based disease detection as fallback"""
     try:
-        # Open and analyze the image
-        img = Image.open(image_path)
-        
-        # Convert to RGB if it's not already
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        # Decode the image as RGB
+        img = load_image(image)
         
         # Resize for consistent analysis
         img = img.resize((224, 224))
@@ -150,8 +180,8 @@ def fallback_detect_disease(image_path):
                 {
                     "class_name": max_class,
                     "confidence": float(confidence),
-                    "description": disease_info[max_class]["description"],
-                    "treatment": disease_info[max_class]["treatment"]
+                    "description": get_disease_info(max_class)["description"],
+                    "treatment": get_disease_info(max_class)["treatment"]
                 }
             ]
         }
@@ -163,8 +193,82 @@ def fallback_detect_disease(image_path):
                 {
                     "class_name": "Early Blight",
                     "confidence": 0.75,
-                    "description": disease_info["Early Blight"]["description"],
-                    "treatment": disease_info["Early Blight"]["treatment"]
+                    "description": get_disease_info("Early Blight")["description"],
+                    "treatment": get_disease_info("Early Blight")["treatment"]
                 }
             ]
         }
+
+# Class names in the order of the fallback score columns
+FALLBACK_CLASSES = ["Early Blight", "Late Blight", "Healthy Potato"]
+FALLBACK_SIZE = 224
+
+def fallback_scores_batch(stack):
+    """Score a (N, 224, 224, 3) uint8 stack with the fallback rules in a few NumPy reductions.
+
+    Returns (class indices into FALLBACK_CLASSES, confidences). Region means are computed
+    from exact integer sums, so they equal the per-image np.mean values bit for bit.
+    """
+    stack = np.asarray(stack)
+    n, height, width, _ = stack.shape
+    half_h, half_w = height // 2, width // 2
+    pixels = height * width
+
+    # Quadrant means in top-left, top-right, bottom-left, bottom-right order: (N, 4, 3)
+    quadrant_sums = stack.reshape(n, 2, half_h, 2, half_w, 3).sum(axis=(2, 4), dtype=np.int64)
+    means = (quadrant_sums / (half_h * half_w)).reshape(n, 4, 3)
+    r, g, b = means[..., 0], means[..., 1], means[..., 2]
+
+    early_blight_score = ((r > g) & (g > b) & (r - b > 50)).sum(axis=1)
+    late_blight_score = ((r < 100) & (g < 100) & (b < 100)).sum(axis=1)
+    healthy_score = ((g > r) & (g > b)).sum(axis=1)
+
+    # Per-channel standard deviation from integer sums of x and x^2
+    flat = stack.reshape(n, pixels, 3)
+    sum_x = flat.sum(axis=1, dtype=np.int64)
+    sum_x2 = np.einsum("npc,npc->nc", flat, flat, dtype=np.int64)
+    channel_std = np.sqrt((pixels * sum_x2 - sum_x * sum_x) / (pixels * pixels))
+    texture_score = channel_std[:, 0] + channel_std[:, 1] + channel_std[:, 2]
+
+    scores = np.stack([
+        early_blight_score * 0.25 + (texture_score / 100) * 0.1,
+        late_blight_score * 0.25 + (texture_score / 150) * 0.15,
+        healthy_score * 0.25 + (1 - texture_score / 200) * 0.15,
+    ], axis=1)
+
+    # argmax keeps the first maximum, like max() over the scores dict
+    best = scores.argmax(axis=1)
+    confidence = np.minimum(0.95, 0.5 + scores[np.arange(n), best])  # Cap at 95% confidence
+    return best, confidence
+
+def fallback_detect_disease_batch(images):
+    """Rule-based detection for a list of images, scored together in one vectorized pass"""
+    stack = resize_batch([load_image(image) for image in images], FALLBACK_SIZE)
+    best, confidence = fallback_scores_batch(stack)
+
+    results = []
+    for index, score in zip(best, confidence):
+        class_name = FALLBACK_CLASSES[index]
+        info = get_disease_info(class_name)
+        results.append({
+            "detections": [
+                {
+                    "class_name": class_name,
+                    "confidence": float(score),
+                    "description": info["description"],
+                    "treatment": info["treatment"]
+                }
+            ]
+        })
+    return results
+
+def detect_disease_batch(images):
+    """Detect disease on a list of images with the YOLO model if loaded, otherwise the batched fallback"""
+    handle = model_registry.ensure_loaded()
+    if handle.model is not None:
+        results = yolo_detect_disease_batch(images, handle)
+    else:
+        results = fallback_detect_disease_batch(images)
+    for result in results:
+        result["model_version"] = handle.version
+    return results
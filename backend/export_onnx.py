@@ -0,0 +1,72 @@
+"""Export best.pt to ONNX for the ONNX Runtime backend, optionally quantized to INT8.
+
+Usage:
+    python export_onnx.py [--int8] [--imgsz 640]
+
+Writes best.onnx next to best.pt (dynamic batch size). With --int8 it also writes
+best.int8.onnx: statically quantized with the images in uploads/ as calibration data,
+or dynamically quantized when there are none. Select it with MODEL_BACKEND=onnx and
+ONNX_MODEL_PATH=best.int8.onnx, then check it with bench_onnx.py.
+"""
+import argparse
+import glob
+import os
+from model_utils import MODEL_PATH
+
+def calibration_images(limit):
+    paths = sorted(glob.glob("uploads/*.jpg") + glob.glob("uploads/*.png"))
+    return paths[:limit]
+
+def quantize(onnx_path, int8_path, imgsz, calibration_limit):
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    )
+    from preprocessing import decode_image, letterbox_batch
+
+    paths = calibration_images(calibration_limit)
+    if not paths:
+        print("No calibration images in uploads/, using dynamic quantization")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        return
+
+    class UploadsReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.paths = iter(paths)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            if path is None:
+                return None
+            batch, _ = letterbox_batch([decode_image(path)], imgsz)
+            # letterbox_batch reuses its buffer, so hand the quantizer a copy
+            return {self.input_name: batch.copy()}
+
+    import onnxruntime as ort
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    print(f"Calibrating on {len(paths)} images from uploads/")
+    quantize_static(
+        onnx_path,
+        int8_path,
+        UploadsReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLO model to ONNX")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="also write an INT8-quantized model")
+    parser.add_argument("--calibration-images", type=int, default=200)
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    onnx_path = YOLO(MODEL_PATH).export(format="onnx", imgsz=args.imgsz, dynamic=True, simplify=True)
+    print(f"Exported {onnx_path}")
+
+    if args.int8:
+        int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+        quantize(onnx_path, int8_path, args.imgsz, args.calibration_images)
+        print(f"Quantized {int8_path}")
@@ -1,17 +1,23 @@
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List
 import uuid
-from datetime import datetime
-import random
-from db_utils import get_db_connection, read_json_file, write_json_file
+from datetime import datetime, timezone
+from jsonl_store import feedback_store
+from async_db import database, to_iso
+from feedback_sampler import database_sampler, file_sampler
+from feedback_stats import record_feedback, database_stats, file_feedback_stats
 
 router = APIRouter(
     prefix="/feedback",
     tags=["feedback"],
 )
 
+# Most testimonials one /feedback/random call returns
+FEEDBACK_MAX_LIMIT = 20
+
 class FeedbackCreate(BaseModel):
     username: str
     rating: int
@@ -36,40 +42,26 @@ async def create_feedback(feedback: FeedbackCreate):
     try:
         # Create feedback with a unique ID
         feedback_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
+        created_at = datetime.now(timezone.utc)
+        timestamp = created_at.isoformat()
         
         # Try database connection first
-        conn = get_db_connection()
-        if conn:
+        if await database.is_available():
             try:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS feedback (
-                        id TEXT PRIMARY KEY,
-                        username TEXT NOT NULL,
-                        rating INTEGER NOT NULL,
-                        comment TEXT NOT NULL,
-                        timestamp TEXT NOT NULL
-                    )
-                ''')
-                
-                cursor.execute('''
-                    INSERT INTO feedback (id, username, rating, comment, timestamp)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (feedback_id, feedback.username, feedback.rating, feedback.comment, timestamp))
-                
-                conn.commit()
-                conn.close()
+                # The aggregates behind /feedback/stats are updated in the same transaction
+                async with database.transaction() as tx:
+                    await tx.execute('''
+                        INSERT INTO feedback (id, username, rating, comment, timestamp)
+                        VALUES ($1, $2, $3, $4, $5)
+                    ''', feedback_id, feedback.username, feedback.rating, feedback.comment, created_at)
+                    await record_feedback(tx, feedback.rating, created_at)
+                database_sampler.add(feedback_id, feedback.rating)
             except Exception as e:
                 print(f"Database operation error: {str(e)}")
-                conn.close()
                 raise
         else:
             # Fallback to file storage
             print("Using file storage fallback for feedback")
-            feedback_data = read_json_file("feedback")
-            
             new_feedback = {
                 "id": feedback_id,
                 "username": feedback.username,
@@ -78,8 +70,9 @@ async def create_feedback(feedback: FeedbackCreate):
                 "timestamp": timestamp
             }
             
-            feedback_data.append(new_feedback)
-            write_json_file("feedback", feedback_data)
+            # Appends one line; the /feedback/stats aggregates follow the store
+            await run_in_threadpool(feedback_store.put, new_feedback)
+            file_sampler.add(new_feedback, feedback.rating)
         
         return FeedbackResponse(
             id=feedback_id,
@@ -99,42 +92,26 @@ async def create_feedback(feedback: FeedbackCreate):
 async def get_all_feedback():
     try:
         # Try database connection first
-        conn = get_db_connection()
-        if conn:
+        if await database.is_available():
             try:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS feedback (
-                        id TEXT PRIMARY KEY,
-                        username TEXT NOT NULL,
-                        rating INTEGER NOT NULL,
-                        comment TEXT NOT NULL,
-                        timestamp TEXT NOT NULL
-                    )
-                ''')
-                
-                cursor.execute('SELECT * FROM feedback ORDER BY timestamp DESC')
-                feedback_items = cursor.fetchall()
-                conn.close()
-                
-                return [
-                    FeedbackResponse(
-                        id=item['id'],
-                        username=item['username'],
-                        rating=item['rating'],
-                        comment=item['comment'],
-                        timestamp=item['timestamp']
-                    ) for item in feedback_items
-                ]
+                feedback_items = await database.fetch('SELECT * FROM feedback ORDER BY timestamp DESC')
             except Exception as e:
                 print(f"Database operation error: {str(e)}")
-                conn.close()
                 raise
+            
+            return [
+                FeedbackResponse(
+                    id=item['id'],
+                    username=item['username'],
+                    rating=item['rating'],
+                    comment=item['comment'],
+                    timestamp=to_iso(item['timestamp'])
+                ) for item in feedback_items
+            ]
         else:
             # Fallback to file storage
             print("Using file storage fallback for feedback")
-            feedback_data = read_json_file("feedback")
+            feedback_data = await run_in_threadpool(feedback_store.all)
             
             # Sort by timestamp in descending order
             feedback_data.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
@@ -155,74 +132,50 @@ async def get_all_feedback():
             detail=f"Failed to retrieve feedback: {str(e)}"
         )
 
+@router.get("/stats")
+async def get_feedback_stats():
+    """Feedback count, average rating and star histogram, all-time and over rolling windows"""
+    try:
+        if await database.is_available():
+            try:
+                return await database_stats()
+            except Exception as e:
+                print(f"Database operation error: {str(e)}")
+                raise
+        else:
+            # Fallback to file storage
+            print("Using file storage fallback for feedback stats")
+            return await run_in_threadpool(file_feedback_stats.stats)
+    except Exception as e:
+        print(f"Error getting feedback stats: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve feedback stats: {str(e)}"
+        )
+
 @router.get("/random", response_model=List[FeedbackResponse])
-async def get_random_feedback(limit: Optional[int] = 3):
+async def get_random_feedback(limit: int = Query(3, ge=1, le=FEEDBACK_MAX_LIMIT)):
     try:
-        # Try database connection first
-        conn = get_db_connection()
-        feedback_list = []
-        
-        if conn:
+        random_feedback = []
+
+        # Sample from the cached pool of testimonials instead of scanning the table
+        if await database.is_available():
             try:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS feedback (
-                        id TEXT PRIMARY KEY,
-                        username TEXT NOT NULL,
-                        rating INTEGER NOT NULL,
-                        comment TEXT NOT NULL,
-                        timestamp TEXT NOT NULL
-                    )
-                ''')
-                
-                # Get total count of feedback
-                cursor.execute('SELECT COUNT(*) as count FROM feedback')
-                total = cursor.fetchone()['count']
-                
-                # If no feedback, return empty list
-                if total == 0:
-                    conn.close()
-                    return []
-                
-                # Get all feedback
-                cursor.execute('SELECT * FROM feedback WHERE rating >= 4')
-                high_rated = cursor.fetchall()
-                
-                # If no high-rated feedback, get all feedback
-                if not high_rated:
-                    cursor.execute('SELECT * FROM feedback')
-                    high_rated = cursor.fetchall()
-                
-                # Convert to list to use random.sample
-                feedback_list = list(high_rated)
-                conn.close()
+                random_feedback = await database_sampler.sample(limit)
             except Exception as e:
                 print(f"Database operation error: {str(e)}")
-                if conn:
-                    conn.close()
         else:
             # Fallback to file storage
             print("Using file storage fallback for random feedback")
-            all_feedback = read_json_file("feedback")
-            
-            # Filter for high ratings
-            high_rated = [f for f in all_feedback if f.get("rating", 0) >= 4]
-            
-            # If no high-rated feedback, use all feedback
-            feedback_list = high_rated if high_rated else all_feedback
-        
-        # Get random samples (up to limit)
-        limit = min(limit, len(feedback_list))
-        random_feedback = random.sample(feedback_list, limit) if feedback_list else []
+            random_feedback = await file_sampler.sample(limit)
         
         return [
             FeedbackResponse(
-                id=item.get("id", str(uuid.uuid4())) if isinstance(item, dict) else item['id'],
-                username=item.get("username", "Anonymous") if isinstance(item, dict) else item['username'],
-                rating=item.get("rating", 5) if isinstance(item, dict) else item['rating'],
-                comment=item.get("comment", "") if isinstance(item, dict) else item['comment'],
-                timestamp=item.get("timestamp", datetime.now().isoformat()) if isinstance(item, dict) else item['timestamp']
+                id=item.get("id", str(uuid.uuid4())),
+                username=item.get("username", "Anonymous"),
+                rating=item.get("rating", 5),
+                comment=item.get("comment", ""),
+                timestamp=to_iso(item.get("timestamp")) or datetime.now().isoformat()
             ) for item in random_feedback
         ]
     except Exception as e:
@@ -231,3 +184,8 @@ async def get_random_feedback(limit: Optional[int] = 3):
             status_code=500,
             detail=f"Failed to retrieve random feedback: {str(e)}"
         )
+
+@router.get("/random/stats")
+async def random_feedback_stats():
+    """Size, age and reload counts of the testimonial pools behind /feedback/random"""
+    return {"database": database_sampler.stats(), "file": file_sampler.stats()}
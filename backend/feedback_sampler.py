@@ -0,0 +1,109 @@
+import os
+import time
+import random
+import asyncio
+from fastapi.concurrency import run_in_threadpool
+from async_db import database
+from jsonl_store import feedback_store
+
+# Ratings at or above this are shown as testimonials
+FEEDBACK_SAMPLE_MIN_RATING = 4
+# Seconds before the pool is reloaded, picking up rows from other workers and deletions
+FEEDBACK_SAMPLE_TTL = float(os.getenv("FEEDBACK_SAMPLE_TTL", "300"))
+
+class FeedbackSampler:
+    """In-memory pool of testimonials eligible for /feedback/random.
+
+    Holds high-rated entries, or every entry while there are none (the previous
+    behaviour). create_feedback adds new rows as they are inserted and the whole pool is
+    reloaded after `ttl` seconds, so sampling is O(limit) and never scans the table.
+    `load` returns (entry, rating) pairs and `resolve` turns sampled entries into rows.
+    """
+
+    def __init__(self, load, resolve, ttl=FEEDBACK_SAMPLE_TTL):
+        self._load = load
+        self._resolve = resolve
+        self.ttl = ttl
+        self._entries = None
+        self._high_rated = False
+        self._loaded_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._refreshes = 0
+        self._samples = 0
+
+    def _expired(self):
+        return self._entries is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def refresh(self):
+        """Reload the pool from storage"""
+        async with self._refresh_lock:
+            # Another request may have reloaded it while this one waited
+            if not self._expired():
+                return
+            pairs = await self._load()
+            high_rated = [entry for entry, rating in pairs if rating >= FEEDBACK_SAMPLE_MIN_RATING]
+            self._high_rated = bool(high_rated)
+            self._entries = high_rated if high_rated else [entry for entry, _ in pairs]
+            self._loaded_at = time.monotonic()
+            self._refreshes += 1
+
+    def add(self, entry, rating):
+        """Record a newly inserted feedback row"""
+        if self._entries is None:
+            return
+        if rating >= FEEDBACK_SAMPLE_MIN_RATING:
+            if not self._high_rated:
+                # The first high-rated row replaces the fallback pool of all feedback
+                self._entries = []
+                self._high_rated = True
+            self._entries.append(entry)
+        elif not self._high_rated:
+            self._entries.append(entry)
+
+    async def sample(self, limit):
+        """Up to `limit` random rows from the pool"""
+        if self._expired():
+            await self.refresh()
+        self._samples += 1
+        entries = self._entries
+        picked = random.sample(entries, min(max(limit, 0), len(entries)))
+        return await self._resolve(picked) if picked else []
+
+    def stats(self):
+        return {
+            "pool_size": len(self._entries) if self._entries is not None else None,
+            "high_rated": self._high_rated,
+            "age_s": time.monotonic() - self._loaded_at if self._entries is not None else None,
+            "ttl_s": self.ttl,
+            "refreshes": self._refreshes,
+            "samples": self._samples,
+        }
+
+async def _load_database_ids():
+    # Only the IDs are held in memory; the rating index keeps this off a full table scan
+    rows = await database.fetch("SELECT id, rating FROM feedback WHERE rating >= $1", FEEDBACK_SAMPLE_MIN_RATING)
+    if not rows:
+        rows = await database.fetch("SELECT id, rating FROM feedback")
+    return [(row["id"], row["rating"]) for row in rows]
+
+async def _fetch_database_rows(ids):
+    placeholders = ", ".join(f"${i}" for i in range(1, len(ids) + 1))
+    rows = await database.fetch(
+        f"SELECT id, username, rating, comment, timestamp FROM feedback WHERE id IN ({placeholders})",
+        *ids
+    )
+    # Keep the random order of the sample
+    by_id = {row["id"]: row for row in rows}
+    return [by_id[feedback_id] for feedback_id in ids if feedback_id in by_id]
+
+async def _load_file_entries():
+    items = await run_in_threadpool(feedback_store.all)
+    return [(item, item.get("rating", 0)) for item in items]
+
+async def _resolve_file_entries(items):
+    return items
+
+# Postgres (or SQLite) pool of feedback IDs; sampled rows are fetched by primary key
+database_sampler = FeedbackSampler(_load_database_ids, _fetch_database_rows)
+# File fallback pool, which keeps the (small) feedback items themselves
+file_sampler = FeedbackSampler(_load_file_entries, _resolve_file_entries)
@@ -0,0 +1,145 @@
+"""Feedback aggregates behind /feedback/stats.
+
+Totals and one row per UTC day are updated together with every insert, so reading the
+stats never touches the feedback table: the totals are one row and the rolling windows
+sum at most the last ROLLING_WINDOW_DAYS daily rows. The file fallback keeps the same
+aggregates in memory.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from async_db import database
+from jsonl_store import feedback_store
+
+STARS = (1, 2, 3, 4, 5)
+# Rolling windows reported next to the all-time totals, in days
+ROLLING_WINDOW_DAYS = (7, 30)
+
+_STAR_COLUMNS = ", ".join(f"stars_{star}" for star in STARS)
+_STAR_UPDATES = ", ".join(f"stars_{star} = {{table}}.stars_{star} + EXCLUDED.stars_{star}" for star in STARS)
+_STAR_PLACEHOLDERS = ", ".join(f"${i}" for i in range(3, 3 + len(STARS)))
+
+def _upsert(table, key):
+    return (
+        f"INSERT INTO {table} ({key}, count, rating_sum, {_STAR_COLUMNS}) "
+        f"VALUES ($1, 1, $2, {_STAR_PLACEHOLDERS}) "
+        f"ON CONFLICT ({key}) DO UPDATE SET count = {table}.count + 1, "
+        f"rating_sum = {table}.rating_sum + EXCLUDED.rating_sum, {_STAR_UPDATES.format(table=table)}"
+    )
+
+_UPDATE_TOTALS = _upsert("feedback_stats", "id")
+_UPDATE_DAILY = _upsert("feedback_daily_stats", "day")
+
+class RatingCounts:
+    """Count, rating sum and per-star histogram of a set of feedback"""
+
+    def __init__(self):
+        self.count = 0
+        self.rating_sum = 0
+        self.histogram = dict.fromkeys(STARS, 0)
+
+    def add(self, rating, count=1):
+        self.count += count
+        self.rating_sum += rating * count
+        self.histogram[rating] = self.histogram.get(rating, 0) + count
+
+    def remove(self, rating):
+        self.add(rating, -1)
+
+    def merge(self, other):
+        self.count += other.count
+        self.rating_sum += other.rating_sum
+        for star in STARS:
+            self.histogram[star] += other.histogram[star]
+
+    def merge_row(self, row):
+        """Add a feedback_stats/feedback_daily_stats row"""
+        self.count += row["count"]
+        self.rating_sum += row["rating_sum"]
+        for star in STARS:
+            self.histogram[star] += row[f"stars_{star}"]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "average_rating": round(self.rating_sum / self.count, 3) if self.count else None,
+            "histogram": {str(star): self.histogram[star] for star in STARS},
+        }
+
+def _summary(totals, daily, today):
+    """Build the response from all-time counts and {day: RatingCounts}"""
+    windows = {}
+    for days in ROLLING_WINDOW_DAYS:
+        window = RatingCounts()
+        for offset in range(days):
+            counts = daily.get(today - timedelta(days=offset))
+            if counts is not None:
+                window.merge(counts)
+        windows[f"{days}d"] = window.to_dict()
+    return {**totals.to_dict(), "windows": windows}
+
+def _as_date(value):
+    """DATE column value (a date from asyncpg, an ISO string from SQLite)"""
+    return value if not isinstance(value, str) else datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+async def record_feedback(tx, rating, created_at):
+    """Update the aggregates for a new feedback row, inside the inserting transaction"""
+    stars = [1 if star == rating else 0 for star in STARS]
+    await tx.execute(_UPDATE_TOTALS, 1, rating, *stars)
+    await tx.execute(_UPDATE_DAILY, created_at.astimezone(timezone.utc).date(), rating, *stars)
+
+async def database_stats():
+    """Aggregates from the totals row and the daily rows of the longest window"""
+    today = datetime.now(timezone.utc).date()
+    totals = RatingCounts()
+    row = await database.fetchrow("SELECT * FROM feedback_stats WHERE id = 1")
+    if row is not None:
+        totals.merge_row(row)
+
+    daily = {}
+    rows = await database.fetch(
+        "SELECT * FROM feedback_daily_stats WHERE day >= $1",
+        today - timedelta(days=max(ROLLING_WINDOW_DAYS) - 1)
+    )
+    for row in rows:
+        counts = daily[_as_date(row["day"])] = RatingCounts()
+        counts.merge_row(row)
+    return _summary(totals, daily, today)
+
+class FileFeedbackStats:
+    """The same aggregates for the file fallback, kept up to date by the feedback store as
+    records are appended (by this or another worker) or deleted"""
+
+    def __init__(self, store=feedback_store):
+        self.store = store
+        # The store calls _on_change from whichever thread syncs it
+        self._lock = threading.Lock()
+        self._totals = RatingCounts()
+        self._daily = {}
+        store.add_listener(self._on_change)
+
+    def _update(self, item, remove):
+        rating = item.get("rating", 0)
+        if rating not in STARS:
+            return
+        update = RatingCounts.remove if remove else RatingCounts.add
+        update(self._totals, rating)
+        try:
+            day = datetime.fromisoformat(item.get("timestamp")).astimezone(timezone.utc).date()
+        except (TypeError, ValueError):
+            return
+        update(self._daily.setdefault(day, RatingCounts()), rating)
+
+    def _on_change(self, previous, record):
+        with self._lock:
+            if previous is not None:
+                self._update(previous, remove=True)
+            if record is not None:
+                self._update(record, remove=False)
+
+    def stats(self):
+        """Blocks on the store's file lock; call through run_in_threadpool from async code"""
+        self.store.refresh()
+        with self._lock:
+            return _summary(self._totals, self._daily, datetime.now(timezone.utc).date())
+
+file_feedback_stats = FileFeedbackStats()
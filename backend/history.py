@@ -1,47 +1,93 @@
-
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+import base64
+import binascii
 import json
 import os
-from db_utils import get_db_connection
+from datetime import datetime
+from async_db import database, to_iso, from_json
+from blob_store import image_url
+from derivatives import image_urls
+from auth import current_user
 
 router = APIRouter(tags=["history"])
 
+# Page size limits for /history
+HISTORY_DEFAULT_LIMIT = 20
+HISTORY_MAX_LIMIT = 100
+
+# Columns that are only returned when requested through ?fields=
+OPTIONAL_FIELDS = {"image_base64"}
+
+def encode_cursor(timestamp, row_id):
+    """Opaque keyset cursor pointing just after (timestamp, id)"""
+    return base64.urlsafe_b64encode(json.dumps([timestamp, row_id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/history/{username}")
-async def get_history(username: str):
-    """Get detection history for a user"""
+async def get_history(username: str, limit: int = HISTORY_DEFAULT_LIMIT, cursor: Optional[str] = None, fields: Optional[str] = None,
+                      claims: dict = Depends(current_user)):
+    """Get one page of detection history for a user, newest first.
+
+    Needs the user's own session token (`Authorization: Bearer`). Pass the returned
+    `next_cursor` as `cursor` to fetch the following page. The inline `image_base64`
+    column is left out unless requested with `fields=image_base64`.
+    """
+    if claims.get("username") != username:
+        raise HTTPException(status_code=403, detail="You can only view your own history")
+
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    extra_fields = set(fields.split(",")) if fields else set()
+    unknown_fields = extra_fields - OPTIONAL_FIELDS
+    if unknown_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+
+    columns = ["id", "image_path", "timestamp", "detections", "model_version"] + sorted(extra_fields)
+    query = f"SELECT {', '.join(columns)} FROM detection_history WHERE username = $1"
+    params = [username]
+    if cursor:
+        # Keyset pagination: served by the (username, timestamp DESC, id DESC) index
+        query += " AND (timestamp, id) < ($2, $3)"
+        params.extend(decode_cursor(cursor))
+    query += f" ORDER BY timestamp DESC, id DESC LIMIT ${len(params) + 1}"
+    # Fetch one extra row to know whether another page exists
+    params.append(limit + 1)
+
     try:
-        # Connect to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Fetch history for the user
-        cursor.execute(
-            "SELECT id, image_path, image_base64, timestamp, detections FROM detection_history WHERE username = %s ORDER BY timestamp DESC",
-            (username,)
-        )
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
+        # Fetch one page of history for the user
+        rows = await database.fetch(query, *params)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # Get the server URL from environment or use Railway URL for production
+        server_url = os.environ.get("SERVER_URL", "http://localhost:8000")
+
         # Format the results
         history = []
         for row in rows:
-            # Extract just the filename from the image_path
-            filename = row['image_path'].split('/')[-1] if row['image_path'] else ""
-            
-            # Get the server URL from environment or use Railway URL for production
-            server_url = os.environ.get("SERVER_URL", "http://localhost:8000")
-            
-            history.append({
+            item = {
                 "id": row['id'],
-                "image_url": f"{server_url}/uploads/{filename}",
-                "image_base64": row['image_base64'],
-                "timestamp": row['timestamp'],
-                "detections": json.loads(row['detections']) if row['detections'] else []
-            })
-        
-        return {"history": history}
-    
+                "image_url": image_url(server_url, row['image_path']),
+                "image_urls": image_urls(server_url, row['image_path']),
+                "timestamp": to_iso(row['timestamp']),
+                "detections": from_json(row['detections']) if row['detections'] else [],
+                "model_version": row['model_version']
+            }
+            for field in extra_fields:
+                item[field] = row[field]
+            history.append(item)
+
+        next_cursor = encode_cursor(to_iso(rows[-1]['timestamp']), rows[-1]['id']) if has_more else None
+
+        return {"history": history, "next_cursor": next_cursor}
+
     except Exception as e:
         # Log the exception in a production environment
         print(f"Error retrieving history: {str(e)}")
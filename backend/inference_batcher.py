@@ -0,0 +1,148 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from detection_utils import detect_disease_batch
+from metrics import observe_stage
+
+# Batching configuration
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+class InferenceBatcher:
+    """Collects concurrent detection requests into batches and runs one forward pass per batch.
+
+    Requests are queued from any thread (or from the event loop through `detect`) and a single
+    background worker thread drains the queue: it waits for the first image, then keeps
+    collecting until either `max_batch_size` images are queued or `max_wait_ms` has passed.
+    """
+
+    def __init__(self, infer_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batches = 0
+        self._images = 0
+        self._errors = 0
+        self._batch_sizes = {}
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._total_inference = 0.0
+
+    def start(self):
+        """Start the worker thread if it is not running yet"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, image):
+        """Queue an image and return a Future resolving to its detections dict"""
+        self.start()
+        future = Future()
+        self._queue.put((image, future, time.perf_counter()))
+        return future
+
+    async def detect(self, image):
+        """Await the detections for a single image from the event loop"""
+        return await asyncio.wrap_future(self.submit(image))
+
+    @staticmethod
+    def _claim(entry, batch):
+        # Requests cancelled while queued (e.g. timed out) are dropped; claimed ones can no longer be cancelled
+        if entry[1].set_running_or_notify_cancel():
+            batch.append(entry)
+
+    def _collect_batch(self):
+        batch = []
+        # Block until there is at least one live request
+        while not batch:
+            self._claim(self._queue.get(), batch)
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                self._claim(self._queue.get(timeout=remaining), batch)
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _resolve(future, result=None, error=None):
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception as e:
+            print(f"Error resolving batched inference request: {str(e)}")
+
+    def _run(self):
+        # Nothing may escape this loop: the thread serves every request
+        while True:
+            try:
+                self._run_batch(self._collect_batch())
+            except Exception as e:
+                print(f"Error in inference batcher: {str(e)}")
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        waits = [started - queued_at for _, _, queued_at in batch]
+
+        try:
+            results = self.infer_batch([image for image, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batched inference returned {len(results)} results for {len(batch)} images")
+            for (_, future, _), result in zip(batch, results):
+                self._resolve(future, result)
+            failed = False
+        except Exception as e:
+            print(f"Error in batched inference: {str(e)}")
+            for _, future, _ in batch:
+                self._resolve(future, error=e)
+            failed = True
+
+        inference_time = time.perf_counter() - started
+        self._record(len(batch), waits, inference_time, failed)
+        for wait in waits:
+            observe_stage("batch_queue_wait", wait)
+        observe_stage("batch_inference", inference_time)
+
+    def _record(self, batch_size, waits, inference_time, failed):
+        with self._lock:
+            self._batches += 1
+            self._images += batch_size
+            self._errors += 1 if failed else 0
+            self._batch_sizes[batch_size] = self._batch_sizes.get(batch_size, 0) + 1
+            self._total_wait += sum(waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(waits))
+            self._total_inference += inference_time
+
+    def stats(self):
+        """Return batch-size and queue-wait statistics for tuning"""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "images": self._images,
+                "errors": self._errors,
+                "avg_batch_size": self._images / self._batches if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": self._total_wait / self._images * 1000.0 if self._images else 0.0,
+                "max_queue_wait_ms": self._max_wait_seen * 1000.0,
+                "avg_batch_inference_ms": self._total_inference / self._batches * 1000.0 if self._batches else 0.0,
+            }
+
+# Shared batcher in front of model_utils.model (or the batched fallback detector)
+batcher = InferenceBatcher(detect_disease_batch)
@@ -0,0 +1,184 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException
+from detection_utils import detect_disease, load_image
+from model_utils import model_registry, warm_up
+from inference_batcher import batcher
+from metrics import timed
+
+# Executor configuration
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread").lower()  # "thread" or "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", "32"))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))
+
+# Seconds warm_up() waits for every worker process to load its model
+PROCESS_WORKER_START_TIMEOUT = 600
+
+# Set in each worker process by _init_process_worker
+_startup_barrier = None
+
+def _init_process_worker(barrier):
+    """Runs once in each worker process: loads best.pt and warms it up in that process"""
+    global _startup_barrier
+    _startup_barrier = barrier
+    warm_up(model_registry.ensure_loaded())
+    print(f"Inference worker process {os.getpid()} ready")
+
+def _process_worker_ready():
+    """Wait until every worker process is running this, then describe this worker's model.
+
+    A worker blocked here cannot take a second call, so the calls land on distinct
+    processes and each of them has run its initializer.
+    """
+    _startup_barrier.wait(PROCESS_WORKER_START_TIMEOUT)
+    handle = model_registry.active
+    return os.getpid(), handle.backend, handle.version, handle.path
+
+def _log_background_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Error in background image task: {str(future.exception())}")
+
+class InferencePool:
+    """Runs inference and image work off the event loop with bounded queue depth and a timeout.
+
+    In "thread" mode, images are decoded in a thread pool and detected through the shared
+    batcher. In "process" mode, each worker process loads best.pt once and runs detection itself;
+    the workers are spawned (not forked from this threaded process) and the parent never loads
+    the model.
+    """
+
+    def __init__(self, kind=INFERENCE_EXECUTOR, workers=INFERENCE_WORKERS,
+                 queue_depth=INFERENCE_QUEUE_DEPTH, timeout=INFERENCE_TIMEOUT):
+        if kind not in ("thread", "process"):
+            print(f"Warning: unknown INFERENCE_EXECUTOR '{kind}', using thread pool")
+            kind = "thread"
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._image_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-worker")
+        self._process_executor = None
+        self._process_lock = threading.Lock()
+
+    def _processes(self):
+        """The worker process pool, created on first use (never at import, which spawned workers repeat)"""
+        with self._process_lock:
+            if self._process_executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._process_executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_process_worker,
+                    initargs=(context.Barrier(self.workers),),
+                )
+            return self._process_executor
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.queue_depth:
+                self._rejected += 1
+                raise HTTPException(status_code=503, detail="Server is busy processing other images. Please try again shortly.")
+            self._in_flight += 1
+
+    def _release(self, completed):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1 if completed else 0
+
+    async def _bounded(self, awaitable):
+        """Apply the queue-depth limit and per-request timeout to a unit of work"""
+        self._admit()
+        completed = False
+        try:
+            result = await asyncio.wait_for(awaitable, self.timeout)
+            completed = True
+            return result
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise HTTPException(status_code=504, detail=f"Image processing timed out after {self.timeout:.0f}s")
+        finally:
+            self._release(completed)
+
+    async def _detect(self, image):
+        loop = asyncio.get_running_loop()
+        if self.kind == "process":
+            # Decoding happens inside the worker process, so it is part of this stage
+            with timed("inference"):
+                return await loop.run_in_executor(self._processes(), detect_disease, image)
+
+        with timed("decode"):
+            img = await loop.run_in_executor(self._image_executor, load_image, image)
+        # Includes the wait for the batch to fill; the batcher also records both separately
+        with timed("inference"):
+            return await batcher.detect(img)
+
+    async def detect(self, image):
+        """Detect disease for an image (file path or in-memory bytes) without blocking the event loop"""
+        return await self._bounded(self._detect(image))
+
+    async def run(self, func, *args):
+        """Run image work (decoding, encoding, file writes) in the image thread pool"""
+        loop = asyncio.get_running_loop()
+        return await self._bounded(loop.run_in_executor(self._image_executor, func, *args))
+
+    def run_background(self, func, *args):
+        """Start image work (e.g. persisting an upload) without waiting for it"""
+        future = self._image_executor.submit(func, *args)
+        future.add_done_callback(_log_background_error)
+        return future
+
+    def warm_up(self):
+        """Run a dummy batch through the model (blocking) so the first request is not slow.
+
+        In "process" mode this instead starts the worker processes, each of which loads and
+        warms up its own copy of the model, waits until all of them are ready and records their
+        model as active (for its version) without loading it in this process.
+        """
+        if self.kind == "process":
+            executor = self._processes()
+            workers = [executor.submit(_process_worker_ready) for _ in range(self.workers)]
+            ready = [future.result() for future in workers]
+            pids = {pid for pid, _, _, _ in ready}
+            if len(pids) != self.workers:
+                raise RuntimeError(f"Only {len(pids)} of {self.workers} inference worker processes started")
+            models = {(backend, version) for _, backend, version, _ in ready}
+            if len(models) > 1:
+                print(f"Warning: inference worker processes loaded different models: {sorted(models)}")
+            _, backend, version, path = ready[0]
+            model_registry.activate_remote(backend, version, path)
+            print(f"All {self.workers} inference worker processes ready")
+        else:
+            warm_up(model_registry.ensure_loaded(), batcher.max_batch_size)
+
+    def stats(self):
+        """Return executor utilization statistics"""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "queue_depth_limit": self.queue_depth,
+                "timeout_s": self.timeout,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+            }
+
+    def shutdown(self):
+        """Stop the worker pools, letting pending upload writes finish"""
+        self._image_executor.shutdown(wait=True)
+        if self._process_executor is not None:
+            self._process_executor.shutdown(wait=False, cancel_futures=True)
+
+# Shared pool used by the prediction endpoints
+inference_pool = InferencePool()
@@ -0,0 +1,235 @@
+"""Append-only JSON Lines storage for the file-based fallback (no PostgreSQL).
+
+Each write appends one line to data/<name>.jsonl under an exclusive file lock, so
+concurrent requests and worker processes never overwrite each other's records; reads
+only take a shared lock. The methods block on file I/O and locks, so async code calls
+them through run_in_threadpool. Records
+are kept in an in-memory index keyed by id, built from the file once and then updated
+from new lines, including lines appended by other workers. When most lines are
+superseded or deleted records, the file is compacted to one line per live record.
+"""
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+from db_utils import FALLBACK_DATA_DIR
+
+try:
+    import fcntl
+    fcntl_available = True
+except ImportError:
+    # Windows: appends are still serialized within the process, but not across workers
+    fcntl_available = False
+
+# Compact once there are this many lines per live record (and at least JSONL_COMPACT_MIN_LINES lines)
+JSONL_COMPACT_RATIO = float(os.getenv("JSONL_COMPACT_RATIO", "2"))
+JSONL_COMPACT_MIN_LINES = int(os.getenv("JSONL_COMPACT_MIN_LINES", "1000"))
+
+class JsonlStore:
+    """Records with an "id" field, stored as an append-only log.
+
+    A line holds a whole record (a newer line for the same id replaces it) or
+    {"id": ..., "_deleted": true}.
+    """
+
+    def __init__(self, name, data_dir=FALLBACK_DATA_DIR):
+        self.name = name
+        self.path = os.path.join(data_dir, f"{name}.jsonl")
+        self.legacy_path = os.path.join(data_dir, f"{name}.json")
+        self._lock_path = self.path + ".lock"
+        self._lock = threading.Lock()
+        self._records = None
+        self._lines = 0
+        self._offset = 0
+        self._inode = None
+        self._compactions = 0
+        self._listeners = []
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        """Lock shared with other processes using the same data directory; `shared` for
+        reads, which only wait for a writer, never for each other"""
+        if not fcntl_available:
+            yield
+            return
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _apply(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A line cut short by a crash mid-write
+            print(f"Skipping unreadable line in {self.path}")
+            return
+        self._lines += 1
+        record_id = record.get("id")
+        previous = self._records.pop(record_id, None)
+        if record.get("_deleted"):
+            record = None
+        else:
+            # Re-insert so an updated record moves to the end, like a new line
+            self._records[record_id] = record
+        self._notify(previous, record)
+
+    def _notify(self, previous, record):
+        if previous is None and record is None:
+            return
+        for listener in self._listeners:
+            try:
+                listener(previous, record)
+            except Exception as e:
+                print(f"Error in {self.name} store listener: {str(e)}")
+
+    def add_listener(self, callback):
+        """Call callback(previous, record) for every record added, replaced or deleted
+        (record is None), including those written by other workers"""
+        self._listeners.append(callback)
+
+    def _migrate_legacy(self):
+        """Convert the old whole-file JSON array once, keeping it as a backup"""
+        if os.path.exists(self.path) or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r") as file:
+                items = json.load(file)
+        except Exception as e:
+            print(f"Error reading {self.legacy_path}: {str(e)}")
+            return
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as file:
+            for item in items:
+                item.setdefault("id", str(uuid.uuid4()))
+                file.write(json.dumps(item) + "\n")
+        os.replace(tmp_path, self.path)
+        os.replace(self.legacy_path, self.legacy_path + ".bak")
+        print(f"Converted {self.legacy_path} to {self.path}")
+
+    def _sync(self):
+        """Bring the index up to date with the file; call with self._lock held"""
+        if self._records is None:
+            self._migrate_legacy()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+
+        if self._records is None or stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            # First load, or the file was compacted by another worker: rebuild the index
+            for record in (self._records or {}).values():
+                self._notify(record, None)
+            self._records = {}
+            self._lines = 0
+            self._offset = 0
+            self._inode = stat.st_ino if stat is not None else None
+        if stat is None or stat.st_size == self._offset:
+            return
+
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        # Leave a trailing partial line (an append in progress) for the next sync
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(line)
+        self._offset += end
+
+    @contextmanager
+    def _read_synced(self):
+        """Hold the index up to date for a read"""
+        with self._lock:
+            # The first load may convert a legacy file, which needs the exclusive lock
+            with self._file_lock(shared=self._records is not None):
+                self._sync()
+            yield
+
+    def refresh(self):
+        """Apply lines appended by other workers"""
+        with self._read_synced():
+            pass
+
+    def load(self):
+        """Build the in-memory index (converting a legacy .json file first)"""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._maybe_compact()
+        return len(self._records)
+
+    def _append(self, entry):
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock, self._file_lock():
+            self._sync()
+            # One write of a whole line in append mode, serialized by the file lock
+            with open(self.path, "ab") as file:
+                if file.seek(0, os.SEEK_END) > self._offset:
+                    # Nobody else can be writing, so the unterminated tail is left over
+                    # from a crash; end it so it cannot corrupt this record
+                    file.write(b"\n")
+                file.write(line)
+                size = file.tell()
+            if self._inode is None:
+                self._inode = os.stat(self.path).st_ino
+            self._apply(line)
+            self._offset = size
+            self._maybe_compact()
+
+    def put(self, record):
+        """Add or replace a record (by its "id") with an O(1) append"""
+        self._append(record)
+        return record
+
+    def delete(self, record_id):
+        self._append({"id": record_id, "_deleted": True})
+
+    def all(self):
+        """Live records in write order"""
+        with self._read_synced():
+            return list(self._records.values())
+
+    def get(self, record_id):
+        with self._read_synced():
+            return self._records.get(record_id)
+
+    def _maybe_compact(self):
+        if self._lines >= JSONL_COMPACT_MIN_LINES and self._lines >= JSONL_COMPACT_RATIO * max(1, len(self._records)):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the file with one line per live record; call with both locks held"""
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as file:
+            for record in self._records.values():
+                file.write((json.dumps(record) + "\n").encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        print(f"Compacted {self.path}: {self._lines} lines to {len(self._records)}")
+        self._inode = stat.st_ino
+        self._offset = stat.st_size
+        self._lines = len(self._records)
+        self._compactions += 1
+
+    def compact(self):
+        with self._lock, self._file_lock():
+            self._sync()
+            self._compact()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.path,
+                "records": len(self._records) if self._records is not None else None,
+                "lines": self._lines,
+                "bytes": self._offset,
+                "compactions": self._compactions,
+            }
+
+# Fallback store for feedback when PostgreSQL is unavailable
+feedback_store = JsonlStore("feedback")
@@ -0,0 +1,236 @@
+"""Latency histograms, gauges and request trace IDs, exported in Prometheus text format.
+
+Recording a duration is a lock and a bisect into fixed buckets, cheap enough to leave on
+in production. Code times its stages with `timed("decode")`; when that runs inside a
+request, the duration is also added to the request's trace, which TraceMiddleware
+returns in the `Server-Timing` header next to the `X-Request-ID` trace ID.
+"""
+import os
+import re
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Requests slower than this are logged with their trace ID and stage breakdown (0 disables)
+METRICS_SLOW_REQUEST_MS = float(os.getenv("METRICS_SLOW_REQUEST_MS", "2000"))
+
+# Seconds; spans fast stages (hashing, cache lookups) up to slow uploads and cold inference
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Trace ID and {stage: seconds} of the request being handled, if any
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination"""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels + ("le",), label_values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labels, labels)} {value}" for labels, value in values)
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time.
+
+    The callback returns a number, or a list of (label values, number) pairs.
+    """
+
+    def __init__(self, name, help_text, callback, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {str(e)}")
+            return lines
+        samples = value if isinstance(value, list) else [((), value)]
+        for label_values, sample in samples:
+            if sample is not None:
+                lines.append(f"{self.name}{_format_labels(self.labels, tuple(label_values))} {float(sample)}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, callback, labels=()):
+        return self.register(Gauge(name, help_text, callback, labels))
+
+    def render(self):
+        """The whole registry in Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Shared registry served at /metrics
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "potato_stage_duration_seconds",
+    "Time spent in each stage of request processing",
+    labels=("stage",),
+)
+request_seconds = registry.histogram(
+    "potato_http_request_duration_seconds",
+    "HTTP request latency by handler, method and status",
+    labels=("handler", "method", "status"),
+)
+
+def observe_stage(stage, seconds):
+    """Record a stage duration, and add it to the current request's trace if there is one"""
+    stage_seconds.observe(seconds, stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        stages = trace[1]
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed(stage):
+    """Time a block as `stage` (works in async code around awaits and in worker threads)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace[0] if trace is not None else None
+
+def _server_timing(stages):
+    return ", ".join(f"{stage};dur={seconds * 1000.0:.1f}" for stage, seconds in stages.items())
+
+class TraceMiddleware:
+    """Gives every HTTP request a trace ID and records its latency.
+
+    An incoming `X-Request-ID` is reused (so traces can span a proxy), otherwise one is
+    generated. The response carries it back, with the stages timed during the request in
+    `Server-Timing`.
+    """
+
+    def __init__(self, app, slow_request_ms=METRICS_SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                trace_id = candidate if _TRACE_ID.match(candidate) else None
+                break
+        trace_id = trace_id or uuid.uuid4().hex
+        stages = {}
+        token = _current_trace.set((trace_id, stages))
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", trace_id.encode("latin-1")))
+                if stages:
+                    headers.append((b"server-timing", _server_timing(stages).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - started
+            # The router stores the matched endpoint in the scope; its name keeps label cardinality low
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", None) or "other"
+            request_seconds.observe(elapsed, handler, scope["method"], str(status))
+            if self.slow_request_ms and elapsed * 1000.0 >= self.slow_request_ms:
+                breakdown = _server_timing(stages) or "no stages recorded"
+                print(f"[trace {trace_id}] Slow request {scope['method']} {scope['path']} -> {status} "
+                      f"in {elapsed * 1000.0:.0f}ms ({breakdown})")
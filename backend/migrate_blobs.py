@@ -0,0 +1,121 @@
+"""One-time migration of detection_history.image_base64 into the blob store.
+
+Usage:
+    python migrate_blobs.py [--batch-size 200] [--vacuum]
+    python migrate_blobs.py --derivatives-only
+
+Each row with an inline image gets its bytes written to the content-addressed blob
+store (with its thumbnail and medium sizes), image_path is pointed at the blob and
+image_base64 is cleared. Rows are processed in id order and committed per batch, so
+the script can be stopped and re-run safely. Afterwards every original in the blob
+store that is missing a derived size gets it, which also covers blobs migrated before
+derived sizes existed and uploads whose background generation failed.
+--vacuum runs VACUUM FULL afterwards to give the space back to the OS.
+"""
+import re
+import argparse
+import base64
+import binascii
+from db_utils import get_db_connection
+from blob_store import blob_store, blob_reference
+from derivatives import generate_derivatives
+
+# Originals are named by their SHA-256; derived sizes add a `_<variant>` suffix
+ORIGINAL_BLOB = re.compile(r"(^|/)[0-9a-f]{64}\.[a-z]+$")
+
+def migrate(batch_size=200):
+    conn = get_db_connection()
+    if conn is None:
+        raise SystemExit("Could not connect to the database")
+
+    migrated = 0
+    skipped = 0
+    last_id = ""
+    try:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(
+                "SELECT id, image_base64 FROM detection_history WHERE image_base64 IS NOT NULL AND id > %s ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for row in rows:
+                last_id = row['id']
+                encoded = row['image_base64']
+                # Some clients stored data URLs
+                if encoded.startswith("data:") and "," in encoded:
+                    encoded = encoded.split(",", 1)[1]
+                try:
+                    file_content = base64.b64decode(encoded)
+                except (binascii.Error, ValueError) as e:
+                    print(f"Skipping {row['id']}: invalid base64 ({str(e)})")
+                    skipped += 1
+                    continue
+
+                key = blob_store.put(file_content)
+                try:
+                    generate_derivatives(file_content, key)
+                except Exception as e:
+                    # The backfill pass retries it
+                    print(f"Error generating derivatives for {key}: {str(e)}")
+                cursor.execute(
+                    "UPDATE detection_history SET image_path = %s, image_base64 = NULL WHERE id = %s",
+                    (blob_reference(key), row['id'])
+                )
+                migrated += 1
+
+            conn.commit()
+            print(f"Migrated {migrated} rows so far (last id {last_id})")
+    finally:
+        conn.close()
+
+    print(f"Done: {migrated} rows moved to the blob store, {skipped} skipped")
+    return migrated
+
+def backfill_derivatives():
+    """Generate the missing derived sizes of every original in the blob store"""
+    generated = 0
+    failed = 0
+    for key in blob_store.keys():
+        if not ORIGINAL_BLOB.search(key):
+            continue
+        try:
+            if generate_derivatives(blob_store.get(key), key):
+                generated += 1
+        except Exception as e:
+            print(f"Error generating derivatives for {key}: {str(e)}")
+            failed += 1
+        if generated and generated % 100 == 0:
+            print(f"Generated derived sizes for {generated} images so far")
+
+    print(f"Done: derived sizes generated for {generated} images, {failed} failed")
+    return generated
+
+def vacuum():
+    """Rewrite detection_history so the freed TOAST space is returned"""
+    conn = get_db_connection()
+    if conn is None:
+        raise SystemExit("Could not connect to the database")
+    try:
+        # VACUUM cannot run inside a transaction block
+        conn.autocommit = True
+        conn.cursor().execute("VACUUM FULL ANALYZE detection_history")
+        print("Vacuumed detection_history")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move detection_history.image_base64 into the blob store")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--vacuum", action="store_true", help="run VACUUM FULL on detection_history afterwards")
+    parser.add_argument("--derivatives-only", action="store_true", help="only backfill missing derived sizes (no database needed)")
+    args = parser.parse_args()
+
+    if not args.derivatives_only:
+        migrate(args.batch_size)
+    backfill_derivatives()
+    if args.vacuum:
+        vacuum()
@@ -0,0 +1,304 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in order, inside its own transaction and is recorded in
+schema_migrations. Migrations are applied at app startup, or by hand with:
+
+    python migrations.py
+"""
+import asyncio
+from async_db import database
+
+# Serializes migrations across workers starting at the same time
+MIGRATION_LOCK_ID = 7318642
+
+# (version, name, PostgreSQL statements, SQLite statements)
+# SQLite is only a development stand-in, so it gets the final schema directly.
+MIGRATIONS = [
+    (
+        1,
+        "initial_schema",
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS detection_history (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                image_path TEXT NOT NULL,
+                image_base64 TEXT,
+                timestamp TEXT NOT NULL,
+                detections TEXT NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS users (
+                id TEXT PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                salt TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS feedback (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                comment TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                content_hash TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                detections TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (content_hash, model_version)
+            )
+            ''',
+        ],
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS detection_history (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                image_path TEXT NOT NULL,
+                image_base64 TEXT,
+                timestamp TIMESTAMPTZ NOT NULL,
+                detections JSONB NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS users (
+                id TEXT PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                salt TEXT NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS feedback (
+                id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                comment TEXT NOT NULL,
+                timestamp TIMESTAMPTZ NOT NULL
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                content_hash TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                detections JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL,
+                PRIMARY KEY (content_hash, model_version)
+            )
+            ''',
+        ],
+    ),
+    (
+        2,
+        "typed_timestamps_and_jsonb",
+        [
+            # USING casts backfill every existing row in place
+            '''
+            ALTER TABLE detection_history
+                ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING timestamp::timestamptz,
+                ALTER COLUMN detections TYPE JSONB USING detections::jsonb
+            ''',
+            '''
+            ALTER TABLE users
+                ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at::timestamptz
+            ''',
+            '''
+            ALTER TABLE feedback
+                ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING timestamp::timestamptz
+            ''',
+            '''
+            ALTER TABLE prediction_cache
+                ALTER COLUMN detections TYPE JSONB USING detections::jsonb,
+                ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at::timestamptz
+            ''',
+        ],
+        [],
+    ),
+    (
+        3,
+        "indexes",
+        [
+            '''
+            CREATE INDEX IF NOT EXISTS idx_detection_history_username_timestamp
+            ON detection_history (username, timestamp DESC, id DESC)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_feedback_timestamp
+            ON feedback (timestamp DESC)
+            ''',
+            '''
+            CREATE INDEX IF NOT EXISTS idx_feedback_rating
+            ON feedback (rating)
+            ''',
+        ],
+        None,
+    ),
+    (
+        4,
+        "detection_history_model_version",
+        [
+            # NULL for rows written before model versions were recorded
+            "ALTER TABLE detection_history ADD COLUMN IF NOT EXISTS model_version TEXT",
+        ],
+        [
+            "ALTER TABLE detection_history ADD COLUMN model_version TEXT",
+        ],
+    ),
+    (
+        5,
+        "feedback_stats",
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS feedback_stats (
+                id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                stars_1 INTEGER NOT NULL DEFAULT 0,
+                stars_2 INTEGER NOT NULL DEFAULT 0,
+                stars_3 INTEGER NOT NULL DEFAULT 0,
+                stars_4 INTEGER NOT NULL DEFAULT 0,
+                stars_5 INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS feedback_daily_stats (
+                day DATE PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                stars_1 INTEGER NOT NULL DEFAULT 0,
+                stars_2 INTEGER NOT NULL DEFAULT 0,
+                stars_3 INTEGER NOT NULL DEFAULT 0,
+                stars_4 INTEGER NOT NULL DEFAULT 0,
+                stars_5 INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            # Backfill from the rows written before the aggregates existed
+            '''
+            INSERT INTO feedback_stats (id, count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+            SELECT 1, COUNT(*), COALESCE(SUM(rating), 0),
+                   COUNT(*) FILTER (WHERE rating = 1),
+                   COUNT(*) FILTER (WHERE rating = 2),
+                   COUNT(*) FILTER (WHERE rating = 3),
+                   COUNT(*) FILTER (WHERE rating = 4),
+                   COUNT(*) FILTER (WHERE rating = 5)
+            FROM feedback
+            ''',
+            '''
+            INSERT INTO feedback_daily_stats (day, count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+            SELECT (timestamp AT TIME ZONE 'UTC')::date, COUNT(*), COALESCE(SUM(rating), 0),
+                   COUNT(*) FILTER (WHERE rating = 1),
+                   COUNT(*) FILTER (WHERE rating = 2),
+                   COUNT(*) FILTER (WHERE rating = 3),
+                   COUNT(*) FILTER (WHERE rating = 4),
+                   COUNT(*) FILTER (WHERE rating = 5)
+            FROM feedback
+            GROUP BY 1
+            ''',
+        ],
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS feedback_stats (
+                id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                stars_1 INTEGER NOT NULL DEFAULT 0,
+                stars_2 INTEGER NOT NULL DEFAULT 0,
+                stars_3 INTEGER NOT NULL DEFAULT 0,
+                stars_4 INTEGER NOT NULL DEFAULT 0,
+                stars_5 INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS feedback_daily_stats (
+                day TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                stars_1 INTEGER NOT NULL DEFAULT 0,
+                stars_2 INTEGER NOT NULL DEFAULT 0,
+                stars_3 INTEGER NOT NULL DEFAULT 0,
+                stars_4 INTEGER NOT NULL DEFAULT 0,
+                stars_5 INTEGER NOT NULL DEFAULT 0
+            )
+            ''',
+            # Backfill from the rows written before the aggregates existed
+            '''
+            INSERT INTO feedback_stats (id, count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+            SELECT 1, COUNT(*), COALESCE(SUM(rating), 0),
+                   COUNT(CASE WHEN rating = 1 THEN 1 END),
+                   COUNT(CASE WHEN rating = 2 THEN 1 END),
+                   COUNT(CASE WHEN rating = 3 THEN 1 END),
+                   COUNT(CASE WHEN rating = 4 THEN 1 END),
+                   COUNT(CASE WHEN rating = 5 THEN 1 END)
+            FROM feedback
+            ''',
+            '''
+            INSERT INTO feedback_daily_stats (day, count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+            SELECT substr(timestamp, 1, 10), COUNT(*), COALESCE(SUM(rating), 0),
+                   COUNT(CASE WHEN rating = 1 THEN 1 END),
+                   COUNT(CASE WHEN rating = 2 THEN 1 END),
+                   COUNT(CASE WHEN rating = 3 THEN 1 END),
+                   COUNT(CASE WHEN rating = 4 THEN 1 END),
+                   COUNT(CASE WHEN rating = 5 THEN 1 END)
+            FROM feedback
+            GROUP BY 1
+            ''',
+        ],
+    ),
+]
+
+async def applied_versions():
+    """Return the set of migration versions already applied"""
+    await database.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    rows = await database.fetch("SELECT version FROM schema_migrations")
+    return {row['version'] for row in rows}
+
+async def apply_migrations():
+    """Apply every pending migration; returns the versions that were applied"""
+    done = await applied_versions()
+    applied = []
+    for version, name, postgres_statements, sqlite_statements in MIGRATIONS:
+        if version in done:
+            continue
+        statements = postgres_statements
+        if database.backend == "sqlite" and sqlite_statements is not None:
+            statements = sqlite_statements
+
+        async with database.transaction() as tx:
+            if database.backend == "postgres":
+                await tx.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_ID)
+                # Another worker may have applied it while we waited for the lock
+                if await tx.fetchval("SELECT 1 FROM schema_migrations WHERE version = $1", version):
+                    continue
+            for statement in statements:
+                await tx.execute(statement)
+            await tx.execute("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name)
+
+        print(f"Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
+
+async def _main():
+    try:
+        applied = await apply_migrations()
+        print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    finally:
+        await database.close()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,138 @@
+"""Local mock of the OpenAI-compatible chat completions API, for working on the chat
+endpoints without network access or a DeepSeek key.
+
+Usage:
+    python mock_deepseek.py [--port 8001]     # serve; set DEEPSEEK_API_BASE=http://localhost:8001/v1
+    python mock_deepseek.py --check           # check chat_client against it and exit
+
+The mock answers POST /v1/chat/completions by echoing the user's message, either as one
+JSON completion or, with "stream": true, as server-sent event chunks ending in
+"data: [DONE]". A message containing "fail" gets HTTP 500. --check runs the client's
+plain and streaming calls and the error path against a mock on a free port, and verifies
+that consecutive requests reuse one keep-alive connection. Exits non-zero on failure.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def reply_for(payload):
+    question = payload["messages"][-1]["content"]
+    return f"Mock answer to: {question}"
+
+class MockHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests, like the real API
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self.path != "/v1/chat/completions":
+            return self._send_json(404, {"error": {"message": "Not found"}})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send_json(401, {"error": {"message": "Missing API key"}})
+        if "fail" in payload["messages"][-1]["content"]:
+            return self._send_json(500, {"error": {"message": "Mock upstream failure"}})
+
+        answer = reply_for(payload)
+        words = answer.split(" ")
+        usage = {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)}
+        if not payload.get("stream"):
+            return self._send_json(200, {
+                "model": payload["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            self._send_chunk(f"data: {json.dumps({'choices': [{'index': 0, 'delta': delta}]})}\n\n")
+        if payload.get("stream_options", {}).get("include_usage"):
+            self._send_chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n")
+        self._send_chunk("data: [DONE]\n\n")
+        self._send_chunk("")
+
+def start_server(port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def run_checks(base_url):
+    from chat_client import DeepSeekClient, DeepSeekError
+
+    client = DeepSeekClient(base_url)
+    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "how do I treat late blight?"}]}
+    failures = []
+    try:
+        expected = "Mock answer to: how do I treat late blight?"
+        for _ in range(3):
+            data = await client.complete("test-key", payload)
+            if data["choices"][0]["message"]["content"] != expected:
+                failures.append(f"complete returned {data!r}")
+
+        streamed, usage = [], None
+        async for chunk in client.stream("test-key", payload):
+            streamed.extend(choice["delta"].get("content", "") for choice in chunk["choices"])
+            usage = chunk.get("usage") or usage
+        if "".join(streamed) != expected or not usage:
+            failures.append(f"stream returned {''.join(streamed)!r} with usage {usage!r}")
+
+        try:
+            await client.complete("test-key", {**payload, "messages": [{"role": "user", "content": "fail"}]})
+            failures.append("an upstream 500 did not raise DeepSeekError")
+        except DeepSeekError as e:
+            if e.status_code != 500:
+                failures.append(f"DeepSeekError had status {e.status_code}")
+    finally:
+        await client.aclose()
+    return failures, client.stats()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions API")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--check", action="store_true", help="check chat_client against the mock and exit")
+    args = parser.parse_args()
+
+    if not args.check:
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), MockHandler)
+        print(f"Mock DeepSeek API on http://127.0.0.1:{args.port}/v1")
+        server.serve_forever()
+
+    server = start_server()
+    failures, stats = asyncio.run(run_checks(f"http://127.0.0.1:{server.server_address[1]}/v1"))
+    server.shutdown()
+    print(f"Client stats: {stats}")
+    print(f"Connections opened for {stats['requests'] + stats['streams']} requests: {MockHandler.connections}")
+    # The 500 response keeps its connection, so everything should share one
+    if MockHandler.connections != 1:
+        failures.append(f"expected one pooled connection, got {MockHandler.connections}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Optional
+import hmac
+import os
+
+from model_utils import model_registry
+from inference_batcher import batcher
+from inference_pool import inference_pool
+
+router = APIRouter(tags=["models"])
+
+# Shared secret for the model management endpoints; they are disabled when unset
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
+class CandidateModel(BaseModel):
+    path: str
+    backend: Optional[str] = None
+    promote: bool = False
+
+def check_admin(token):
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model management is disabled. Set MODEL_ADMIN_TOKEN to enable it.")
+    # Constant-time, so response timing does not reveal how much of the token matched
+    if not token or not hmac.compare_digest(token.encode("utf-8"), MODEL_ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    if inference_pool.kind == "process":
+        raise HTTPException(status_code=400, detail="Models cannot be swapped with INFERENCE_EXECUTOR=process")
+
+@router.get("/models")
+async def get_models():
+    """Active, staged and previous models plus shadow traffic comparison"""
+    return model_registry.stats()
+
+@router.post("/models/candidate")
+async def stage_candidate(candidate: CandidateModel, x_admin_token: Optional[str] = Header(None)):
+    """Load and warm up a new weights file in the background while the active model keeps serving.
+
+    The candidate then receives MODEL_SHADOW_FRACTION of batches as shadow traffic until it is
+    promoted, or is promoted right away with `promote: true`.
+    """
+    check_admin(x_admin_token)
+    if candidate.backend not in (None, "pytorch", "onnx"):
+        raise HTTPException(status_code=400, detail=f"Unknown backend: {candidate.backend}")
+    if not os.path.isfile(candidate.path):
+        raise HTTPException(status_code=400, detail=f"Model file not found: {candidate.path}")
+
+    try:
+        await run_in_threadpool(model_registry.stage, candidate.path, candidate.backend, batcher.max_batch_size)
+        if candidate.promote:
+            await run_in_threadpool(model_registry.promote)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model_registry.stats()
+
+@router.post("/models/promote")
+async def promote_candidate(x_admin_token: Optional[str] = Header(None)):
+    """Swap the staged candidate in as the active model"""
+    check_admin(x_admin_token)
+    try:
+        await run_in_threadpool(model_registry.promote)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_registry.stats()
+
+@router.post("/models/rollback")
+async def rollback_model(x_admin_token: Optional[str] = Header(None)):
+    """Switch back to the previously active model"""
+    check_admin(x_admin_token)
+    try:
+        await run_in_threadpool(model_registry.rollback)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_registry.stats()
+
+@router.delete("/models/candidate")
+async def discard_candidate(x_admin_token: Optional[str] = Header(None)):
+    """Drop the staged candidate and stop shadowing"""
+    check_admin(x_admin_token)
+    model_registry.discard_candidate()
+    return model_registry.stats()
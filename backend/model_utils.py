@@ -1,34 +1,280 @@
 
 import os
+import time
+import random
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 
 
 # Model file path
 MODEL_PATH = os.getenv("MODEL_PATH", "best.pt")
+# Inference backend: "pytorch" (ultralytics YOLO on best.pt) or "onnx" (ONNX Runtime on an exported model)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pytorch").lower()
+# Exported model used by the "onnx" backend (see export_onnx.py; point it at best.int8.onnx for INT8)
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "best.onnx")
+
+# Share of batches also run on a staged candidate model to compare it with the active one
+MODEL_SHADOW_FRACTION = float(os.getenv("MODEL_SHADOW_FRACTION", "0.1"))
+
+# None until a model load has tried to import ultralytics
+yolo_available = None
+
+# A loaded model and where it came from; `model` is None for the rule-based fallback
+ModelHandle = namedtuple("ModelHandle", ["model", "backend", "version", "path"])
+FALLBACK_MODEL = ModelHandle(None, "fallback", "fallback", None)
+
+def compute_model_version(path):
+    """Short content hash of a weights file, used to tie cached predictions to the exact model"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+def _load_onnx_model(path):
+    """ONNX Runtime session for an exported model, or None"""
+    try:
+        from onnx_backend import OnnxDetector
+    except ImportError:
+        print("Warning: onnxruntime not available.")
+        return None
+    if not os.path.exists(path):
+        print(f"Warning: ONNX model {path} not found. Export it with: python export_onnx.py")
+        return None
+    try:
+        detector = OnnxDetector(path)
+        print(f"Successfully loaded ONNX model from {path}")
+        return detector
+    except Exception as e:
+        print(f"Error loading ONNX model: {str(e)}")
+        return None
+
+def _load_pytorch_model(path):
+    """Ultralytics YOLO model for a .pt weights file, or None"""
+    global yolo_available
+    # Try to import YOLO model
+    try:
+        from ultralytics import YOLO
+        yolo_available = True
+    except ImportError:
+        print("Warning: Ultralytics YOLO not available. Using fallback detection method.")
+        yolo_available = False
+        return None
 
-# Try to import YOLO model
-try:
-    from ultralytics import YOLO
-    yolo_available = True
-except ImportError:
-    print("Warning: Ultralytics YOLO not available. Using fallback detection method.")
-    yolo_available = False
-
-# Initialize YOLO model if available
-model = None
-if yolo_available:
     try:
         # Try to load the model
-        if os.path.exists(MODEL_PATH):
-            model = YOLO(MODEL_PATH)
-            print(f"Successfully loaded YOLOv8 model from {MODEL_PATH}")
-        else:
-            print(f"Warning: Model file {MODEL_PATH} not found. Using fallback detection method.")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"Absolute path to model: {os.path.abspath(MODEL_PATH)}")
-            print(f"Files in current directory: {os.listdir('.')}")
-            print(f"Files in backend directory (if exists): {os.listdir('./backend') if os.path.exists('./backend') else 'backend dir not found'}")
+        if os.path.exists(path):
+            yolo = YOLO(path)
+            print(f"Successfully loaded YOLOv8 model from {path}")
+            return yolo
+        print(f"Warning: Model file {path} not found. Using fallback detection method.")
+        print(f"Current working directory: {os.getcwd()}")
+        print(f"Absolute path to model: {os.path.abspath(path)}")
+        print(f"Files in current directory: {os.listdir('.')}")
+        print(f"Files in backend directory (if exists): {os.listdir('./backend') if os.path.exists('./backend') else 'backend dir not found'}")
     except Exception as e:
         print(f"Error loading YOLO model: {str(e)}. Using fallback detection method.")
+    return None
+
+def load_weights(path, backend=None):
+    """Load a weights file into a ModelHandle, or return None if it cannot be loaded.
+
+    The backend defaults to "onnx" for .onnx files and "pytorch" otherwise.
+    """
+    backend = backend or ("onnx" if path.endswith(".onnx") else "pytorch")
+    model = _load_onnx_model(path) if backend == "onnx" else _load_pytorch_model(path)
+    if model is None:
+        return None
+    try:
+        version = compute_model_version(path)
+    except Exception as e:
+        print(f"Error hashing model file: {str(e)}")
+        version = "unknown"
+    print(f"Model version: {version} ({backend} backend)")
+    return ModelHandle(model, backend, version, path)
+
+def predict_boxes(handle, images):
+    """Run a loaded model on RGB images; returns [x_min, y_min, x_max, y_max, confidence, class_id] rows per image"""
+    if handle.backend == "onnx":
+        # ONNX Runtime backend returns the box rows directly
+        return handle.model(images)
+    return [result.boxes.data.tolist() for result in handle.model(images)]
+
+def top_class_id(boxes):
+    """Class of the most confident box, or None"""
+    return int(max(boxes, key=lambda box: box[4])[5]) if boxes else None
+
+class ModelRegistry:
+    """The model serving predictions, swappable at runtime without a restart.
+
+    A new weights file is staged as a candidate: loaded and warmed up in the background
+    while the active model keeps serving. While staged, a share of batches is also run on
+    the candidate (off the request path) to compare latency and top-class agreement.
+    Promoting swaps it in with a single reference assignment, so every batch runs entirely
+    on either the old or the new model and in-flight requests are never dropped.
+    """
+
+    def __init__(self, shadow_fraction=MODEL_SHADOW_FRACTION):
+        self.active = None
+        self.candidate = None
+        self.previous = None
+        self.shadow_fraction = max(0.0, min(1.0, shadow_fraction))
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._listeners = []
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-shadow")
+        self._shadow_busy = False
+        self._reset_shadow_stats()
+
+    def _reset_shadow_stats(self):
+        self._shadow = {"batches": 0, "images": 0, "agreements": 0, "active_time": 0.0, "candidate_time": 0.0, "errors": 0}
+
+    @property
+    def loaded(self):
+        return self.active is not None
+
+    @property
+    def version(self):
+        return self.active.version if self.active is not None else None
+
+    def add_swap_listener(self, callback):
+        """Call callback(version) whenever a different model becomes active"""
+        self._listeners.append(callback)
+
+    def _activate(self, handle):
+        self.previous, self.active = self.active, handle
+        for callback in self._listeners:
+            callback(handle.version)
+        print(f"Active model is now {handle.version} ({handle.backend} backend)")
+
+    def ensure_loaded(self):
+        """Load the configured model on first use; concurrent callers wait for the first load"""
+        if self.active is not None:
+            return self.active
+        with self._load_lock:
+            if self.active is None:
+                handle = None
+                if MODEL_BACKEND == "onnx":
+                    handle = load_weights(ONNX_MODEL_PATH, "onnx")
+                    if handle is None:
+                        print("Falling back to the PyTorch backend.")
+                if handle is None:
+                    handle = load_weights(MODEL_PATH, "pytorch")
+                self._activate(handle or FALLBACK_MODEL)
+        return self.active
+
+    def activate_remote(self, backend, version, path):
+        """Record a model loaded by the inference worker processes as active, without loading
+        it here, so its version still tags cached predictions and history rows"""
+        with self._load_lock:
+            self._activate(ModelHandle(None, backend, version, path))
+        return self.active
+
+    def stage(self, path, backend=None, warmup_batch=1):
+        """Load and warm up a candidate model (blocking) without changing the active model"""
+        with self._load_lock:
+            handle = load_weights(path, backend)
+            if handle is None:
+                raise ValueError(f"Could not load model from {path}")
+            warm_up(handle, warmup_batch)
+            with self._stats_lock:
+                self.candidate = handle
+                self._reset_shadow_stats()
+            return handle
+
+    def promote(self):
+        """Make the staged candidate the active model"""
+        with self._load_lock:
+            if self.candidate is None:
+                raise ValueError("No candidate model is staged")
+            handle, self.candidate = self.candidate, None
+            self._activate(handle)
+            return handle
+
+    def rollback(self):
+        """Switch back to the model that was active before the last promotion"""
+        with self._load_lock:
+            if self.previous is None:
+                raise ValueError("No previous model to roll back to")
+            self._activate(self.previous)
+            return self.active
+
+    def discard_candidate(self):
+        with self._stats_lock:
+            self.candidate = None
+
+    def shadow(self, images, active_boxes, active_time):
+        """Maybe run the same batch on the candidate in the background and record the comparison"""
+        candidate = self.candidate
+        if candidate is None or candidate.model is None or random.random() >= self.shadow_fraction:
+            return
+        with self._stats_lock:
+            # Skip rather than queue up when the candidate is slower than the traffic
+            if self._shadow_busy:
+                return
+            self._shadow_busy = True
+        self._shadow_executor.submit(self._run_shadow, candidate, images, active_boxes, active_time)
+
+    def _run_shadow(self, candidate, images, active_boxes, active_time):
+        try:
+            started = time.perf_counter()
+            candidate_boxes = predict_boxes(candidate, images)
+            candidate_time = time.perf_counter() - started
+            agreements = sum(
+                top_class_id(expected) == top_class_id(actual)
+                for expected, actual in zip(active_boxes, candidate_boxes)
+            )
+            with self._stats_lock:
+                if self.candidate is candidate:
+                    self._shadow["batches"] += 1
+                    self._shadow["images"] += len(images)
+                    self._shadow["agreements"] += agreements
+                    self._shadow["active_time"] += active_time
+                    self._shadow["candidate_time"] += candidate_time
+        except Exception as e:
+            print(f"Error in shadow inference: {str(e)}")
+            with self._stats_lock:
+                self._shadow["errors"] += 1
+        finally:
+            with self._stats_lock:
+                self._shadow_busy = False
+
+    def stats(self):
+        """Active, candidate and previous models plus shadow comparison results"""
+        def describe(handle):
+            return None if handle is None else {"version": handle.version, "backend": handle.backend, "path": handle.path}
+
+        with self._stats_lock:
+            shadow = dict(self._shadow)
+        images = shadow["images"]
+        return {
+            "active": describe(self.active),
+            "candidate": describe(self.candidate),
+            "previous": describe(self.previous),
+            "shadow": {
+                "fraction": self.shadow_fraction,
+                "batches": shadow["batches"],
+                "images": images,
+                "errors": shadow["errors"],
+                "top_class_agreement": shadow["agreements"] / images if images else None,
+                "active_ms_per_image": shadow["active_time"] / images * 1000.0 if images else None,
+                "candidate_ms_per_image": shadow["candidate_time"] / images * 1000.0 if images else None,
+            },
+        }
+
+def warm_up(handle, batch_size=1):
+    """Run one dummy batch so the first real request does not pay for graph and allocator warm-up"""
+    if handle.model is None:
+        return
+    images = [Image.new("RGB", (640, 640), (128, 128, 128)) for _ in range(max(1, batch_size))]
+    predict_boxes(handle, images)
+
+# Shared model registry; the configured model is loaded lazily on first use so importing
+# this module (and binding the port) stays fast
+model_registry = ModelRegistry()
 
 # Define class names for YOLO model
 class_names = {
@@ -76,3 +322,14 @@ disease_info = {
         "treatment": "Consult with an agricultural expert for proper diagnosis and treatment recommendations."
     }
 }
+
+# The rule-based fallback reports its own class names; map them onto disease_info entries
+fallback_class_aliases = {
+    "Early Blight": "Early Blight Disease",
+    "Late Blight": "Late Blight Disease",
+    "Healthy Potato": "Healthy",
+}
+
+def get_disease_info(class_name):
+    """Description and treatment for a class name, falling back to "Unknown" """
+    return disease_info.get(fallback_class_aliases.get(class_name, class_name), disease_info["Unknown"])
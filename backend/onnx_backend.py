@@ -0,0 +1,86 @@
+"""ONNX Runtime inference for the exported YOLOv8 detector.
+
+Runs the model without importing PyTorch or ultralytics. Pre- and post-processing follow
+ultralytics' defaults (letterbox to 640, confidence 0.25, class-aware NMS at IoU 0.7), so
+the boxes match what `YOLO(best.pt)` returns as `result.boxes.data`.
+"""
+import os
+import numpy as np
+import onnxruntime as ort
+from box_utils import batched_nms
+from preprocessing import letterbox_batch, MODEL_INPUT_SIZE
+
+ONNX_INPUT_SIZE = int(os.getenv("ONNX_INPUT_SIZE", str(MODEL_INPUT_SIZE)))
+ONNX_CONF_THRESHOLD = float(os.getenv("ONNX_CONF_THRESHOLD", "0.25"))
+ONNX_IOU_THRESHOLD = float(os.getenv("ONNX_IOU_THRESHOLD", "0.7"))
+# Threads per forward pass; 0 lets ONNX Runtime use every physical core
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+ONNX_MAX_DETECTIONS = 300
+
+class OnnxDetector:
+    """YOLOv8 detector on an ONNX Runtime CPU session.
+
+    Calling it with a list of RGB PIL images returns, per image, a list of
+    `[x_min, y_min, x_max, y_max, confidence, class_id]` rows in original image pixels.
+    """
+
+    def __init__(self, path, conf_threshold=ONNX_CONF_THRESHOLD, iou_threshold=ONNX_IOU_THRESHOLD,
+                 input_size=ONNX_INPUT_SIZE, threads=ONNX_THREADS):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Models exported without dynamic=True only accept one image per forward pass
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.input_size = input_size
+
+    def __call__(self, images):
+        if not images:
+            return []
+        batch, transforms = letterbox_batch(images, self.input_size)
+        if self.fixed_batch:
+            outputs = np.concatenate([
+                self.session.run(None, {self.input_name: batch[i:i + self.fixed_batch]})[0]
+                for i in range(0, len(batch), self.fixed_batch)
+            ])
+        else:
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [
+            self._postprocess(output, scale, padding, img.size)
+            for output, (scale, padding), img in zip(outputs, transforms, images)
+        ]
+
+    def _postprocess(self, output, scale, padding, image_size):
+        # (4 + classes, anchors) -> (anchors, 4 + classes)
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        confidences = class_scores[np.arange(len(class_ids)), class_ids]
+        mask = confidences > self.conf_threshold
+        if not mask.any():
+            return []
+        predictions, class_ids, confidences = predictions[mask], class_ids[mask], confidences[mask]
+
+        # Center/size to corners
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        keep = batched_nms(boxes, confidences, class_ids, self.iou_threshold)[:ONNX_MAX_DETECTIONS]
+        boxes, class_ids, confidences = boxes[keep], class_ids[keep], confidences[keep]
+
+        # Undo the letterbox
+        left, top = padding
+        boxes -= np.array([left, top, left, top], dtype=boxes.dtype)
+        boxes /= scale
+        width, height = image_size
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+        return [
+            [*box, float(confidence), float(class_id)]
+            for box, confidence, class_id in zip(boxes.tolist(), confidences, class_ids)
+        ]
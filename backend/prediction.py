@@ -1,14 +1,22 @@
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse
 import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 
 
 # Import our new utility modules
-from db_utils import get_db_connection
-from detection_utils import detect_disease, image_to_base64
+from async_db import database
+from inference_batcher import batcher
+from tiling import tiled_detector
+from inference_pool import inference_pool
+from prediction_cache import prediction_cache, cached_detect
+from blob_store import blob_reference, image_url as build_image_url
+from derivatives import generate_derivatives, image_urls
+from upload_utils import receive_image_upload
+from metrics import timed
 
 router = APIRouter(tags=["prediction"])
 
@@ -16,10 +24,20 @@ router = APIRouter(tags=["prediction"])
 SERVER_URL = os.environ.get("SERVER_URL", "http://localhost:8000")
 print(f"Using SERVER_URL: {SERVER_URL}")
 
+async def save_detection(file_id, username, image_path, detections, model_version):
+    """Insert a detection_history row referencing the image in the blob store"""
+    await database.execute(
+        "INSERT INTO detection_history (id, username, image_path, timestamp, detections, model_version) VALUES ($1, $2, $3, $4, $5, $6)",
+        file_id,
+        username,
+        image_path,
+        datetime.now(timezone.utc),
+        json.dumps(detections),
+        model_version
+    )
+
 @router.post("/predict/")
 async def predict(file: UploadFile = File(...), username: str = Form(...)):
-    print(f"Received prediction request for user: {username}")
-    
     if not username:
         raise HTTPException(status_code=400, detail="Username is required")
     
@@ -32,64 +50,51 @@ async def predict(file: UploadFile = File(...), username: str = Form(...)):
         if content_type not in ["image/png", "image/jpeg", "image/jpg"]:
             raise HTTPException(status_code=400, detail=f"Invalid file type: {content_type}. Please upload a PNG or JPEG image.")
         
-        # Save the uploaded file
-        file_extension = os.path.splitext(file.filename)[1].lower() if file.filename else ".jpg"
         file_id = str(uuid.uuid4())
-        file_path = f"uploads/{file_id}{file_extension}"
-        
-        # Create uploads directory if it doesn't exist
-        os.makedirs("uploads", exist_ok=True)
         
-        # Read file content
-        file_content = await file.read()
-        if not file_content:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        # Stream the upload into the blob store while hashing it; identical images share one blob.
+        # Non-images, oversized files and decompression bombs are rejected from the header bytes.
+        file_content, content_hash, blob_key = await receive_image_upload(file)
+        image_path = blob_reference(blob_key)
         
-        # Write to file
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Generate the thumbnail/medium sizes off the latency path; detection works from memory
+        inference_pool.run_background(generate_derivatives, file_content, blob_key)
         
-        print(f"File saved to {file_path}")
-        
-        # Get detection results
-        result = detect_disease(file_path)
-        
-        # Convert image to base64 for storage
-        image_base64 = image_to_base64(file_path)
-        if not image_base64:
-            raise HTTPException(status_code=500, detail="Failed to process the image")
+        # Get detection results off the event loop (cached by image content and model version)
+        result = await cached_detect(file_content, content_hash)
         
         # Create a full URL for the image that will work from the frontend
-        image_url = f"{SERVER_URL}/uploads/{file_id}{file_extension}"
-        print(f"Created image URL: {image_url}")
+        image_url = build_image_url(SERVER_URL, image_path)
         
         # Save to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO detection_history (id, username, image_path, image_base64, timestamp, detections) VALUES (%s, %s, %s, %s, %s, %s)",
-            (
-                file_id,
-                username,
-                file_path,
-                image_base64,
-                datetime.now().isoformat(),
-                json.dumps(result['detections'])
-            )
-        )
-        conn.commit()
-        conn.close()
+        with timed("db_insert"):
+            await save_detection(file_id, username, image_path, result['detections'], result.get('model_version'))
         
         # Return results with absolute image URL
         response_data = {
             "id": file_id,
             "image_url": image_url,
-            "detections": result['detections']
+            "image_urls": image_urls(SERVER_URL, image_path),
+            "detections": result['detections'],
+            "model_version": result.get('model_version')
         }
         
-        print(f"Returning response data: {response_data}")
-        return response_data
+        # Render the JSON here so serialization shows up in the stage timings
+        with timed("serialize"):
+            return JSONResponse(response_data)
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in predict endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An error occurred during processing: {str(e)}")
+
+@router.get("/predict/stats")
+async def prediction_stats():
+    """Inference batching, executor, tiling and prediction cache statistics for tuning"""
+    return {
+        "batching": batcher.stats(),
+        "executor": inference_pool.stats(),
+        "tiling": tiled_detector.stats(),
+        "cache": prediction_cache.stats()
+    }
@@ -0,0 +1,210 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from db_utils import db_connection, FALLBACK_DATA_DIR
+from async_db import from_json
+from inference_pool import inference_pool
+from model_utils import model_registry
+from tiling import tiled_detector
+
+# Cache configuration
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+# Optional second tier: "none", "disk" or "postgres"
+PREDICTION_CACHE_BACKEND = os.getenv("PREDICTION_CACHE_BACKEND", "none").lower()
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR", os.path.join(FALLBACK_DATA_DIR, "prediction_cache"))
+
+def content_digest(file_content):
+    """SHA-256 of the uploaded bytes"""
+    return hashlib.sha256(file_content).hexdigest()
+
+class PredictionCache:
+    """Detections keyed by image content hash and model version.
+
+    The first tier is a bounded in-memory LRU. An optional disk or Postgres tier survives
+    restarts and is shared between workers. Keys include the model version and a hash of the
+    tiling settings (`settings_key`), so a new best.pt or new TILE_* values never serve
+    predictions made under the previous ones. Until the model has loaded the version is
+    unknown (None) and the cache is bypassed.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, backend=PREDICTION_CACHE_BACKEND,
+                 cache_dir=PREDICTION_CACHE_DIR, model_version=None, settings_key=""):
+        if backend not in ("none", "disk", "postgres"):
+            print(f"Warning: unknown PREDICTION_CACHE_BACKEND '{backend}', using memory only")
+            backend = "none"
+        self.max_entries = max(0, max_entries)
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._persistent_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._pruned_version = None
+        self.settings_key = settings_key
+        self.model_version = None
+        self.cache_version = None
+        self.set_model_version(model_version)
+
+    @property
+    def persistent(self):
+        return self.backend != "none"
+
+    def set_model_version(self, model_version):
+        """Drop entries from other model versions"""
+        with self._lock:
+            if model_version == self.model_version:
+                return
+            self.model_version = model_version
+            self.cache_version = f"{model_version}-{self.settings_key}" if model_version is not None else None
+            self._entries.clear()
+
+        if self.backend == "disk" and model_version is not None:
+            # Stale versions live in sibling directories and are removed
+            try:
+                os.makedirs(self._version_dir(), exist_ok=True)
+                for name in os.listdir(self.cache_dir):
+                    if name != self.cache_version:
+                        shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            except Exception as e:
+                print(f"Error preparing prediction cache directory: {str(e)}")
+
+    def _version_dir(self):
+        return os.path.join(self.cache_dir, self.cache_version)
+
+    def get(self, content_hash, persistent=True):
+        """Return cached detections for an image hash, or None"""
+        if self.model_version is None:
+            return None
+        with self._lock:
+            result = self._entries.get(content_hash)
+            if result is not None:
+                self._entries.move_to_end(content_hash)
+                self._memory_hits += 1
+                return result
+
+        if persistent and self.persistent:
+            result = self._get_persistent(content_hash)
+            if result is not None:
+                self._put_memory(content_hash, result)
+                with self._lock:
+                    self._persistent_hits += 1
+                return result
+
+        # A memory-only probe of a tiered cache is not a miss yet
+        if persistent or not self.persistent:
+            with self._lock:
+                self._misses += 1
+        return None
+
+    def put(self, content_hash, result, persistent=True):
+        """Store detections for an image hash"""
+        # Results finished by a model that has since been swapped out belong to no cached version
+        if self.model_version is None or result.get("model_version", self.model_version) != self.model_version:
+            return
+        self._put_memory(content_hash, result)
+        if persistent and self.persistent:
+            self._put_persistent(content_hash, result)
+
+    def _put_memory(self, content_hash, result):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[content_hash] = result
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _get_persistent(self, content_hash):
+        try:
+            if self.backend == "disk":
+                path = os.path.join(self._version_dir(), f"{content_hash}.json")
+                if os.path.exists(path):
+                    with open(path, "r") as f:
+                        return json.load(f)
+            elif self.backend == "postgres":
+                with db_connection() as conn:
+                    if conn:
+                        cursor = conn.cursor()
+                        cursor.execute(
+                            "SELECT detections FROM prediction_cache WHERE content_hash = %s AND model_version = %s",
+                            (content_hash, self.cache_version)
+                        )
+                        row = cursor.fetchone()
+                        if row:
+                            return {"detections": from_json(row['detections']), "model_version": self.model_version}
+        except Exception as e:
+            print(f"Error reading prediction cache: {str(e)}")
+        return None
+
+    def _put_persistent(self, content_hash, result):
+        try:
+            if self.backend == "disk":
+                path = os.path.join(self._version_dir(), f"{content_hash}.json")
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(result, f)
+                os.replace(tmp_path, path)
+            elif self.backend == "postgres":
+                with db_connection() as conn:
+                    if conn:
+                        cursor = conn.cursor()
+                        if self._pruned_version != self.cache_version:
+                            # Entries of older model versions (or tiling settings) are never read again
+                            cursor.execute("DELETE FROM prediction_cache WHERE model_version <> %s", (self.cache_version,))
+                            self._pruned_version = self.cache_version
+                        cursor.execute(
+                            "INSERT INTO prediction_cache (content_hash, model_version, detections, created_at) VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING",
+                            (content_hash, self.cache_version, json.dumps(result['detections']), datetime.now(timezone.utc))
+                        )
+                        conn.commit()
+        except Exception as e:
+            print(f"Error writing prediction cache: {str(e)}")
+
+    def stats(self):
+        """Return hit/miss counters"""
+        with self._lock:
+            hits = self._memory_hits + self._persistent_hits
+            lookups = hits + self._misses
+            return {
+                "backend": self.backend,
+                "model_version": self.model_version,
+                "cache_version": self.cache_version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": hits,
+                "memory_hits": self._memory_hits,
+                "persistent_hits": self._persistent_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+# Shared prediction cache, following the active model
+prediction_cache = PredictionCache(settings_key=tiled_detector.settings_key())
+model_registry.add_swap_listener(prediction_cache.set_model_version)
+
+async def cached_detect(file_content, content_hash=None):
+    """Detect disease for an uploaded image, reusing cached detections for identical bytes"""
+    if content_hash is None:
+        content_hash = await inference_pool.run(content_digest, file_content)
+
+    # Memory lookups are cheap enough for the event loop; the persistent tier is not
+    result = prediction_cache.get(content_hash, persistent=False)
+    if result is None and prediction_cache.persistent:
+        result = await run_in_threadpool(prediction_cache.get, content_hash)
+    if result is not None:
+        return result
+
+    result = await inference_pool.detect(file_content)
+    prediction_cache.put(content_hash, result, persistent=False)
+    if prediction_cache.persistent:
+        await run_in_threadpool(prediction_cache.put, content_hash, result)
+    return result
@@ -0,0 +1,129 @@
+import time
+import asyncio
+from contextlib import contextmanager
+from fastapi.concurrency import run_in_threadpool
+from model_utils import model_registry
+from async_db import database, ASYNC_DB_RETRY_INTERVAL
+from migrations import apply_migrations
+from inference_pool import inference_pool
+from jsonl_store import feedback_store
+
+class StartupState:
+    """Startup split into phases that run after the server has bound its port.
+
+    The model loads and warms up in a worker thread while the database is migrated, and
+    each phase's duration is logged so cold-start regressions are easy to spot.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.model_ready = False
+        self.db_ready = False
+        # Serving from the file fallback store while the database is unreachable
+        self.db_fallback = False
+        self.errors = {}
+        self._tasks = []
+
+    @contextmanager
+    def phase(self, name):
+        """Time a startup phase and log its duration"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.phases[name] = round(seconds, 3)
+        print(f"Startup phase '{name}' took {seconds:.3f}s")
+
+    @property
+    def ready(self):
+        return self.model_ready and (self.db_ready or self.db_fallback)
+
+    def _check_ready(self):
+        if self.ready and "ready" not in self.phases:
+            self.record("ready", time.perf_counter() - self.started)
+
+    def _load_model(self):
+        if inference_pool.kind == "process":
+            # Each worker process loads its own copy; this one only records the version
+            with self.phase("model_workers"):
+                inference_pool.warm_up()
+            return
+        # Activating the model also sets the prediction cache's model version
+        with self.phase("model_load"):
+            model_registry.ensure_loaded()
+        with self.phase("model_warmup"):
+            inference_pool.warm_up()
+
+    async def prepare_model(self):
+        try:
+            await run_in_threadpool(self._load_model)
+            self.model_ready = True
+            self._check_ready()
+        except Exception as e:
+            print(f"Error preparing model: {str(e)}")
+            self.errors["model"] = str(e)
+
+    async def prepare_database(self):
+        # The database may be provisioned after the app starts (e.g. on Railway), so keep trying
+        started = time.perf_counter()
+        if not await database.is_available():
+            # Requests use the file fallback until then, so build its index now
+            try:
+                with self.phase("fallback_store_load"):
+                    await run_in_threadpool(feedback_store.load)
+                self.db_fallback = True
+                self._check_ready()
+            except Exception as e:
+                print(f"Error loading fallback store: {str(e)}")
+                self.errors["database"] = str(e)
+        # Keep trying in the background and switch to the database once it appears
+        while not await database.is_available():
+            await asyncio.sleep(ASYNC_DB_RETRY_INTERVAL)
+        self.record("db_connect", time.perf_counter() - started)
+        try:
+            with self.phase("db_migrations"):
+                await apply_migrations()
+            self.db_ready = True
+            self.db_fallback = False
+            self.errors.pop("database", None)
+            self._check_ready()
+        except Exception as e:
+            print(f"Error applying database migrations: {str(e)}")
+            self.errors["database"] = str(e)
+
+    def start(self):
+        """Schedule the model and database phases without waiting for them"""
+        self.started = time.perf_counter()
+        self._tasks = [
+            asyncio.create_task(self.prepare_model()),
+            asyncio.create_task(self.prepare_database()),
+        ]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def status(self):
+        """Readiness of each component plus the phase timings"""
+        return {
+            "ready": self.ready,
+            "model": {
+                "ready": self.model_ready,
+                "backend": model_registry.active.backend if model_registry.loaded else None,
+                "version": model_registry.version,
+                "error": self.errors.get("model"),
+            },
+            "database": {
+                "ready": self.db_ready or self.db_fallback,
+                "mode": "database" if self.db_ready else "fallback" if self.db_fallback else None,
+                "error": self.errors.get("database"),
+            },
+            "phases": dict(self.phases),
+        }
+
+# Shared startup state for app.py
+startup_state = StartupState()
@@ -0,0 +1,30 @@
+import os
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+# Blob files never change once written, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with strong ETags and long cache lifetimes for content-addressed files.
+
+    Blob names start with the SHA-256 of the original upload (and legacy uploads have
+    unique UUID names), so the file name is a stable validator: the ETag is derived
+    from it instead of from mtime and size, and stays the same across re-deploys.
+    """
+
+    def __init__(self, *args, cache_control=IMMUTABLE_CACHE_CONTROL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        name = os.path.splitext(os.path.basename(full_path))[0]
+        response.headers["etag"] = f'"{name}"'
+        response.headers["cache-control"] = self.cache_control
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
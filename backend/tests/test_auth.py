@@ -0,0 +1,37 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import auth
+from auth import issue_token, verify_token
+from history import router as history_router
+
+def test_token_round_trip():
+    claims = verify_token(issue_token("user-1", "grower"))
+    assert claims["sub"] == "user-1" and claims["username"] == "grower"
+
+def test_tampered_and_expired_tokens_are_rejected():
+    payload, signature = issue_token("user-1", "grower").split(".")
+    other_payload = issue_token("user-2", "someone").split(".")[0]
+    with pytest.raises(ValueError):
+        verify_token(f"{other_payload}.{signature}")
+    with pytest.raises(ValueError):
+        verify_token(issue_token("user-1", "grower", ttl=-1))
+    with pytest.raises(ValueError):
+        verify_token("not-a-token")
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(history_router)
+    return TestClient(app)
+
+def test_history_needs_a_bearer_token(client):
+    response = client.get("/history/grower")
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+def test_history_of_another_user_is_forbidden(client):
+    token = auth.issue_token("user-2", "someone")
+    response = client.get("/history/grower", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
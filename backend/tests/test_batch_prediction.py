@@ -0,0 +1,39 @@
+import io
+import json
+import asyncio
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+import batch_prediction
+
+def upload(name):
+    return UploadFile(io.BytesIO(b"image"), filename=name, headers=Headers({"content-type": "image/png"}))
+
+async def read_lines(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+def test_concurrent_lots_share_the_batch_in_flight_limit(monkeypatch):
+    async def run():
+        active, peak = 0, 0
+
+        async def fake_process_image(username, filename, file_content):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.005)
+            active -= 1
+            return {"filename": filename, "error": "skipped"}, None
+
+        monkeypatch.setattr(batch_prediction, "process_image", fake_process_image)
+        monkeypatch.setattr(batch_prediction, "batch_slots", asyncio.Semaphore(3))
+        lots = [
+            await batch_prediction.predict_batch([upload(f"{lot}-{i}.png") for i in range(10)], username="grower")
+            for lot in range(2)
+        ]
+        results = await asyncio.gather(*(read_lines(response) for response in lots))
+        return peak, results
+
+    peak, results = asyncio.run(run())
+    # Two lots of 10 with BATCH_CONCURRENCY 16 each still never hold more than 3 pool slots
+    assert peak == 3
+    assert all(lines[-1]["summary"]["failed"] == 10 for lines in results)
@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+
+import chat
+from chat_cache import ChatCache
+from chat_client import DeepSeekClient
+from test_chat_client import QUESTION, ANSWER, mock_completions
+
+def gated_client(calls, gate):
+    """Client whose upstream calls wait for gate(call number) before answering"""
+    async def handler(request):
+        calls.append(request)
+        await gate(len(calls))
+        return mock_completions(request)
+    return DeepSeekClient("http://mock/v1", transport=httpx.MockTransport(handler))
+
+async def collect(message):
+    return [event async for event in chat.relay_stream(message, "test-key")]
+
+async def wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+def test_concurrent_streams_and_chat_share_one_upstream_call(monkeypatch):
+    async def run():
+        calls = []
+        release = asyncio.Event()
+
+        async def gate(call):
+            await release.wait()
+
+        monkeypatch.setattr(chat, "deepseek_client", gated_client(calls, gate))
+        monkeypatch.setattr(chat, "chat_cache", ChatCache())
+        message = chat.ChatMessage(message=QUESTION)
+
+        first = asyncio.create_task(collect(message))
+        await wait_for(lambda: calls)
+        second = asyncio.create_task(collect(chat.ChatMessage(message=QUESTION.upper())))
+        plain = asyncio.create_task(chat.chat(message, api_key="test-key"))
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(first, second, plain)
+        return (len(calls), *results, chat.chat_cache.stats())
+
+    upstream_calls, first, second, plain, stats = asyncio.run(run())
+    assert upstream_calls == 1
+    assert len(first) > 2
+    assert '"cached": false' in first[-1]
+    assert second[0] == chat.sse_event({"content": ANSWER})
+    assert '"cached": true' in second[-1]
+    assert plain["response"] == ANSWER and plain["cached"] is True
+    assert stats["coalesced"] == 2 and stats["upstream_calls"] == 1 and stats["in_flight"] == 0
+
+def test_waiters_ask_upstream_when_the_stream_client_disconnects(monkeypatch):
+    async def run():
+        calls = []
+
+        async def gate(call):
+            # The first stream never gets an answer before its client goes away
+            if call == 1:
+                await asyncio.Event().wait()
+
+        monkeypatch.setattr(chat, "deepseek_client", gated_client(calls, gate))
+        monkeypatch.setattr(chat, "chat_cache", ChatCache())
+        message = chat.ChatMessage(message=QUESTION)
+
+        abandoned = asyncio.create_task(collect(message))
+        await wait_for(lambda: calls)
+        waiter = asyncio.create_task(collect(message))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        events = await waiter
+        return len(calls), events, chat.chat_cache.stats()
+
+    upstream_calls, events, stats = asyncio.run(run())
+    assert upstream_calls == 2
+    assert '"cached": false' in events[-1]
+    assert stats["in_flight"] == 0 and stats["entries"] == 1
@@ -0,0 +1,129 @@
+import json
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import chat
+from chat_cache import ChatCache
+from chat_client import DeepSeekClient, DeepSeekError
+
+QUESTION = "how do I treat late blight?"
+ANSWER = f"Mock answer to: {QUESTION}"
+PAYLOAD = {"model": "deepseek-chat", "messages": [{"role": "user", "content": QUESTION}]}
+
+def mock_completions(request):
+    """OpenAI-compatible chat completions, like mock_deepseek.py but in-process"""
+    assert request.url.path == "/v1/chat/completions"
+    assert request.headers["Authorization"] == "Bearer test-key"
+    payload = json.loads(request.content)
+    question = payload["messages"][-1]["content"]
+    if "fail" in question:
+        return httpx.Response(500, json={"error": {"message": "Mock upstream failure"}})
+
+    words = f"Mock answer to: {question}".split(" ")
+    usage = {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)}
+    if not payload.get("stream"):
+        return httpx.Response(200, json={
+            "model": payload["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    events = [
+        {"choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+        for i, word in enumerate(words)
+    ]
+    if payload.get("stream_options", {}).get("include_usage"):
+        events.append({"choices": [], "usage": usage})
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=body.encode("utf-8"))
+
+def make_client():
+    return DeepSeekClient("http://mock/v1", transport=httpx.MockTransport(mock_completions))
+
+def parse_sse(text):
+    """(event, data) pairs of a server-sent event stream"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        event = "message"
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[6:])))
+    return events
+
+def test_complete_returns_the_completion():
+    async def run():
+        client = make_client()
+        try:
+            return await client.complete("test-key", PAYLOAD), client.stats()
+        finally:
+            await client.aclose()
+
+    data, stats = asyncio.run(run())
+    assert data["choices"][0]["message"]["content"] == ANSWER
+    assert data["usage"]["total_tokens"] > 0
+    assert stats["requests"] == 1 and stats["errors"] == 0
+
+def test_stream_yields_chunks_and_usage():
+    async def run():
+        client = make_client()
+        try:
+            return [chunk async for chunk in client.stream("test-key", PAYLOAD)]
+        finally:
+            await client.aclose()
+
+    chunks = asyncio.run(run())
+    content = "".join(choice["delta"]["content"] for chunk in chunks for choice in chunk["choices"])
+    assert content == ANSWER
+    assert chunks[-1]["usage"]["total_tokens"] > 0
+
+def test_upstream_error_raises_deepseek_error():
+    async def run():
+        client = make_client()
+        try:
+            await client.complete("test-key", {**PAYLOAD, "messages": [{"role": "user", "content": "fail"}]})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(DeepSeekError) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 500
+    assert "Mock upstream failure" in error.value.detail
+
+@pytest.fixture
+def chat_app(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setattr(chat, "deepseek_client", make_client())
+    monkeypatch.setattr(chat, "chat_cache", ChatCache())
+    app = FastAPI()
+    app.include_router(chat.router)
+    return TestClient(app)
+
+def test_chat_stream_relays_sse_events(chat_app):
+    response = chat_app.post("/chat/stream", json={"message": QUESTION})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    content = "".join(data["content"] for event, data in events if event == "message")
+    assert content == ANSWER
+    event, done = events[-1]
+    assert event == "done"
+    assert done == {"model": "deepseek-chat", "tokens_used": done["tokens_used"], "cached": False}
+    assert done["tokens_used"] > 0
+
+    # The streamed answer was cached, so asking again is one content event
+    events = parse_sse(chat_app.post("/chat/stream", json={"message": QUESTION}).text)
+    assert events[0] == ("message", {"content": ANSWER})
+    assert events[-1][1]["cached"] is True
+
+def test_chat_stream_reports_upstream_errors(chat_app):
+    events = parse_sse(chat_app.post("/chat/stream", json={"message": "fail"}).text)
+    assert len(events) == 1
+    event, data = events[0]
+    assert event == "error"
+    assert data["detail"].startswith("DeepSeek API Error: HTTP 500")
@@ -0,0 +1,30 @@
+import io
+from PIL import Image
+
+import derivatives
+from blob_store import LocalBlobStore, blob_reference
+from derivatives import image_urls, generate_derivatives
+
+def jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (40, 160, 60)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def test_missing_sizes_point_at_the_original(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(derivatives, "blob_store", store)
+    content = jpeg(1600, 1200)
+    key = store.put(content)
+
+    urls = image_urls("http://server", blob_reference(key))
+    assert urls == {"original": f"http://server/blobs/{key}", "thumbnail": urls["original"], "medium": urls["original"]}
+
+    generate_derivatives(content, key)
+    urls = image_urls("http://server", blob_reference(key))
+    assert urls["thumbnail"].endswith(f"_thumbnail{derivatives.DERIVATIVE_EXTENSION}")
+    assert urls["medium"].endswith(f"_medium{derivatives.DERIVATIVE_EXTENSION}")
+    assert sorted(store.keys()) == sorted([key] + [derivatives.derivative_key(key, v) for v in ("thumbnail", "medium")])
+
+def test_legacy_uploads_have_no_derived_sizes():
+    urls = image_urls("http://server", "uploads/leaf.jpg")
+    assert set(urls.values()) == {"http://server/uploads/leaf.jpg"}
@@ -0,0 +1,48 @@
+import time
+import threading
+
+from inference_batcher import InferenceBatcher
+
+def test_cancelled_request_does_not_stop_the_batcher():
+    started = threading.Event()
+    release = threading.Event()
+
+    def infer_batch(images):
+        started.set()
+        release.wait(5)
+        return [{"image": image} for image in images]
+
+    batcher = InferenceBatcher(infer_batch, max_batch_size=4, max_wait_ms=50)
+    # Occupy the worker so the next two requests queue up together
+    busy = batcher.submit("busy")
+    assert started.wait(5)
+    cancelled = batcher.submit("cancelled")
+    kept = batcher.submit("kept")
+    assert cancelled.cancel()
+    release.set()
+
+    assert busy.result(timeout=5) == {"image": "busy"}
+    assert kept.result(timeout=5) == {"image": "kept"}
+    assert batcher._thread.is_alive()
+    # And it keeps serving later requests
+    assert batcher.submit("later").result(timeout=5) == {"image": "later"}
+
+def test_failed_batch_reaches_every_request_and_the_thread_survives():
+    calls = []
+
+    def infer_batch(images):
+        calls.append(len(images))
+        if len(calls) == 1:
+            raise RuntimeError("model failed")
+        return [{"image": image} for image in images]
+
+    batcher = InferenceBatcher(infer_batch, max_batch_size=4, max_wait_ms=20)
+    failing = batcher.submit("a")
+    try:
+        failing.result(timeout=5)
+        assert False, "expected the batch error"
+    except RuntimeError as e:
+        assert str(e) == "model failed"
+    time.sleep(0.01)
+    assert batcher.submit("b").result(timeout=5) == {"image": "b"}
+    assert batcher._thread.is_alive()
@@ -0,0 +1,35 @@
+import fcntl
+import threading
+
+from jsonl_store import JsonlStore
+
+def test_put_replace_and_delete(tmp_path):
+    store = JsonlStore("feedback", data_dir=str(tmp_path))
+    store.put({"id": "a", "rating": 5})
+    store.put({"id": "b", "rating": 3})
+    store.put({"id": "a", "rating": 4})
+    store.delete("b")
+
+    assert store.all() == [{"id": "a", "rating": 4}]
+    assert store.get("b") is None
+    # Another worker's view, built from the file alone
+    assert JsonlStore("feedback", data_dir=str(tmp_path)).all() == [{"id": "a", "rating": 4}]
+
+def test_reads_only_take_a_shared_lock(tmp_path):
+    store = JsonlStore("feedback", data_dir=str(tmp_path))
+    store.put({"id": "a", "rating": 5})
+    other = JsonlStore("feedback", data_dir=str(tmp_path))
+    other.load()
+    store.put({"id": "b", "rating": 4})
+
+    results = []
+    with open(store._lock_path, "a") as lock_file:
+        # Another worker reading at the same time
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        reader = threading.Thread(target=lambda: results.append(other.all()))
+        reader.start()
+        reader.join(timeout=5)
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    assert not reader.is_alive()
+    assert [record["id"] for record in results[0]] == ["a", "b"]
@@ -0,0 +1,35 @@
+import io
+import os
+import asyncio
+from fastapi import UploadFile
+from PIL import Image
+
+import upload_utils
+from blob_store import LocalBlobStore
+from metrics import stage_seconds, registry
+
+def stage_count(stage):
+    with stage_seconds._lock:
+        series = stage_seconds._series.get((stage,))
+        return sum(series[0]) if series else 0
+
+def test_multi_chunk_upload_is_one_sample_per_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_utils, "blob_store", LocalBlobStore(str(tmp_path)))
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (1200, 1000), os.urandom(1200 * 1000 * 3)).save(buffer, "PNG", compress_level=0)
+    content = buffer.getvalue()
+    assert len(content) > 3 * upload_utils.UPLOAD_CHUNK_SIZE
+
+    reads, writes = stage_count("upload_read"), stage_count("blob_write")
+    upload = UploadFile(io.BytesIO(content), filename="leaf.png")
+    received, _, key = asyncio.run(upload_utils.receive_image_upload(upload))
+
+    assert received == content
+    assert key.endswith(".png")
+    assert stage_count("upload_read") == reads + 1
+    assert stage_count("blob_write") == writes + 1
+
+def test_registry_renders_stage_histogram():
+    text = registry.render()
+    assert "# TYPE potato_stage_duration_seconds histogram" in text
+    assert text.endswith("\n")
@@ -0,0 +1,47 @@
+import asyncio
+
+import startup
+from startup import StartupState
+
+class FakeDatabase:
+    def __init__(self):
+        self.available = False
+
+    async def is_available(self):
+        return self.available
+
+class FakeStore:
+    loaded = False
+
+    def load(self):
+        self.loaded = True
+
+def test_fallback_store_is_ready_until_the_database_appears(monkeypatch):
+    database, store, migrated = FakeDatabase(), FakeStore(), []
+
+    async def apply_migrations():
+        migrated.append(True)
+
+    monkeypatch.setattr(startup, "database", database)
+    monkeypatch.setattr(startup, "feedback_store", store)
+    monkeypatch.setattr(startup, "apply_migrations", apply_migrations)
+    monkeypatch.setattr(startup, "ASYNC_DB_RETRY_INTERVAL", 0.001)
+
+    async def run():
+        state = StartupState()
+        state.model_ready = True
+        task = asyncio.create_task(state.prepare_database())
+        while not state.db_fallback:
+            await asyncio.sleep(0.001)
+        fallback = state.status()
+
+        database.available = True
+        await asyncio.wait_for(task, 1)
+        return fallback, state.status()
+
+    fallback, connected = asyncio.run(run())
+    assert store.loaded
+    assert fallback["ready"] and fallback["database"]["mode"] == "fallback"
+    assert "ready" in fallback["phases"] and "db_migrations" not in fallback["phases"]
+    assert migrated == [True]
+    assert connected["ready"] and connected["database"]["mode"] == "database"
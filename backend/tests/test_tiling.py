@@ -0,0 +1,25 @@
+from PIL import Image
+
+from tiling import TiledDetector, tile_windows
+
+def test_forward_passes_are_capped_at_max_batch():
+    batches = []
+
+    def predict(inputs):
+        batches.append(len(inputs))
+        return [[] for _ in inputs]
+
+    detector = TiledDetector(mode="auto", max_batch=8)
+    large = Image.new("RGB", (4000, 3000))
+    small = Image.new("RGB", (640, 480))
+    results = detector.detect(predict, [large, small, large])
+
+    inputs = 2 * (1 + len(tile_windows(4000, 3000))) + 1
+    assert len(results) == 3
+    assert sum(batches) == inputs
+    assert max(batches) <= 8
+    assert detector.stats()["forward_passes"] == len(batches)
+
+def test_settings_key_follows_the_tiling_mode():
+    assert TiledDetector(mode="auto").settings_key() == TiledDetector(mode="auto").settings_key()
+    assert TiledDetector(mode="auto").settings_key() != TiledDetector(mode="off").settings_key()
@@ -0,0 +1,51 @@
+import pytest
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.testclient import TestClient
+
+from upload_utils import UploadSizeLimitMiddleware
+
+LIMIT = 100_000
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/predict/")
+    async def predict(file: UploadFile = File(...), username: str = Form(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/other")
+    async def other(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/predict/": LIMIT})
+    return TestClient(app)
+
+def form(size):
+    return {"files": {"file": ("leaf.png", b"x" * size, "image/png")}, "data": {"username": "grower"}}
+
+def test_upload_under_the_limit_is_accepted(client):
+    response = client.post("/predict/", **form(1000))
+    assert response.status_code == 200
+    assert response.json() == {"size": 1000}
+
+def test_content_length_over_the_limit_is_rejected(client):
+    response = client.post("/predict/", **form(LIMIT * 2))
+    assert response.status_code == 413
+
+def test_chunked_upload_is_cut_off_at_the_limit(client):
+    request = client.build_request("POST", "/predict/", **form(LIMIT * 2))
+    body = request.read()
+
+    def chunks():
+        for start in range(0, len(body), 10_000):
+            yield body[start:start + 10_000]
+
+    # A generator body is sent without Content-Length
+    response = client.post("/predict/", content=chunks(), headers={"content-type": request.headers["content-type"]})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload is too large"}
+
+def test_other_paths_are_not_limited(client):
+    response = client.post("/other", files=form(LIMIT * 2)["files"])
+    assert response.status_code == 200
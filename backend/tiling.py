@@ -0,0 +1,155 @@
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from box_utils import batched_nms
+
+# "auto" tiles images whose longer side exceeds TILE_THRESHOLD, "on" tiles every image, "off" never tiles
+TILED_INFERENCE = os.getenv("TILED_INFERENCE", "auto").lower()
+TILE_THRESHOLD = int(os.getenv("TILE_THRESHOLD", "2048"))
+# Tile edge in original pixels and the share of each tile overlapping its neighbour
+TILE_SIZE = int(os.getenv("TILE_SIZE", "1280"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+# Intersection over the smaller box above which boxes from neighbouring tiles are merged
+TILE_NMS_THRESHOLD = float(os.getenv("TILE_NMS_THRESHOLD", "0.6"))
+# Most inputs (tiles included) per forward pass: the batcher's BATCH_MAX_SIZE, read here
+# because inference_batcher imports this module through detection_utils
+TILE_MAX_BATCH = max(1, int(os.getenv("BATCH_MAX_SIZE", "8")))
+
+def should_tile(image_size, mode=TILED_INFERENCE, threshold=TILE_THRESHOLD):
+    if mode == "on":
+        return True
+    if mode == "off":
+        return False
+    return max(image_size) > threshold
+
+def tile_windows(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """(left, top, right, bottom) windows covering the image with overlapping tiles.
+
+    The last tile of each row and column is aligned to the image edge instead of
+    running past it, so every tile has the same size (or the image's, if smaller).
+    """
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1.0 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    tile_width, tile_height = min(tile_size, width), min(tile_size, height)
+    return [
+        (left, top, left + tile_width, top + tile_height)
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+def merge_tile_boxes(tile_boxes, windows, threshold=TILE_NMS_THRESHOLD):
+    """Shift per-tile boxes back to image coordinates and merge duplicates across tiles"""
+    rows = [
+        [box[0] + left, box[1] + top, box[2] + left, box[3] + top, box[4], box[5]]
+        for boxes, (left, top, _, _) in zip(tile_boxes, windows)
+        for box in boxes
+    ]
+    if not rows:
+        return []
+    rows = np.array(rows, dtype=np.float64)
+    keep = batched_nms(rows[:, :4], rows[:, 4], rows[:, 5], threshold, metric="ios")
+    return rows[keep].tolist()
+
+class TiledDetector:
+    """Splits large images into overlapping tiles so small lesions survive the network's downscale.
+
+    Each tiled image contributes its tiles plus one whole-image view (which keeps lesions
+    larger than a tile intact) to the batched forward passes, which are split so none runs
+    more than `max_batch` inputs. Boxes are mapped back to original coordinates and merged
+    with cross-tile NMS.
+    """
+
+    def __init__(self, mode=TILED_INFERENCE, max_batch=TILE_MAX_BATCH):
+        if mode not in ("auto", "on", "off"):
+            print(f"Warning: unknown TILED_INFERENCE '{mode}', using auto")
+            mode = "auto"
+        self.mode = mode
+        self.max_batch = max(1, max_batch)
+        self._forward_passes = 0
+        self._lock = threading.Lock()
+        self._tiled_images = 0
+        self._untiled_images = 0
+        self._tiles = 0
+        self._tiled_time = 0.0
+        self._untiled_time = 0.0
+
+    def detect(self, predict, images):
+        """Run predict(list of images) -> box rows per image, tiling the large images"""
+        plan = []
+        inputs = []
+        for img in images:
+            if should_tile(img.size, self.mode):
+                windows = [(0, 0, img.width, img.height)] + tile_windows(img.width, img.height)
+                # The first window is the whole image, the rest are crops
+                inputs.append(img)
+                inputs.extend(img.crop(window) for window in windows[1:])
+            else:
+                windows = None
+                inputs.append(img)
+            plan.append(windows)
+
+        started = time.perf_counter()
+        outputs = []
+        for start in range(0, len(inputs), self.max_batch):
+            outputs.extend(predict(inputs[start:start + self.max_batch]))
+        elapsed = time.perf_counter() - started
+        forward_passes = -(-len(inputs) // self.max_batch)
+
+        results = []
+        position = 0
+        tiles = 0
+        for windows in plan:
+            if windows is None:
+                results.append(outputs[position])
+                position += 1
+            else:
+                results.append(merge_tile_boxes(outputs[position:position + len(windows)], windows))
+                position += len(windows)
+                tiles += len(windows) - 1
+
+        # Split the forward pass time between tiled and untiled images by their share of inputs
+        tiled_count = sum(1 for windows in plan if windows is not None)
+        with self._lock:
+            self._tiled_images += tiled_count
+            self._untiled_images += len(plan) - tiled_count
+            self._tiles += tiles
+            self._forward_passes += forward_passes
+            if inputs:
+                tiled_share = (tiles + tiled_count) / len(inputs)
+                self._tiled_time += elapsed * tiled_share
+                self._untiled_time += elapsed * (1.0 - tiled_share)
+        return results
+
+    def settings_key(self):
+        """Short hash of the settings that change detections, part of the prediction cache version"""
+        settings = f"{self.mode}:{TILE_THRESHOLD}:{TILE_SIZE}:{TILE_OVERLAP}:{TILE_NMS_THRESHOLD}"
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:8]
+
+    def stats(self):
+        """Return tile counts and per-image latency for tiled and untiled images"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "threshold_px": TILE_THRESHOLD,
+                "tile_size_px": TILE_SIZE,
+                "overlap": TILE_OVERLAP,
+                "max_batch": self.max_batch,
+                "forward_passes": self._forward_passes,
+                "tiled_images": self._tiled_images,
+                "untiled_images": self._untiled_images,
+                "tiles": self._tiles,
+                "avg_tiles_per_image": self._tiles / self._tiled_images if self._tiled_images else 0.0,
+                "avg_tiled_ms": self._tiled_time / self._tiled_images * 1000.0 if self._tiled_images else 0.0,
+                "avg_untiled_ms": self._untiled_time / self._untiled_images * 1000.0 if self._untiled_images else 0.0,
+            }
+
+# Shared tiled detector used by detection_utils
+tiled_detector = TiledDetector()
@@ -0,0 +1,214 @@
+import os
+import time
+import struct
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from blob_store import blob_store
+from metrics import observe_stage
+
+# Upload limits
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# Decoded size limit; a small file that claims more pixels than this is a decompression bomb
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(50_000_000)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# How far into the file the dimensions may be (JPEG EXIF blocks come before them)
+UPLOAD_HEADER_BYTES = 256 * 1024
+# Room for multipart boundaries and form fields on top of the file itself
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Pillow refuses to decode anything larger, including images that slip past the header check
+Image.MAX_IMAGE_PIXELS = UPLOAD_MAX_PIXELS
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+# Start-of-frame markers, which carry the JPEG dimensions (C4, C8 and CC are not frames)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8, *range(0xD0, 0xD8)}
+
+def sniff_image(header):
+    """Read the format and dimensions from the first bytes of a PNG or JPEG.
+
+    Returns (extension, width, height), or None when more bytes are needed. Raises
+    ValueError for anything that is not a PNG or JPEG.
+    """
+    if header.startswith(PNG_SIGNATURE):
+        # The IHDR chunk always comes first: length, "IHDR", width, height
+        if len(header) < 24:
+            return None
+        if header[12:16] != b"IHDR":
+            raise ValueError("Malformed PNG header")
+        width, height = struct.unpack(">II", header[16:24])
+        return ".png", width, height
+
+    if header.startswith(JPEG_SIGNATURE):
+        offset = 2
+        while True:
+            # Skip fill bytes before the marker
+            while offset < len(header) and header[offset] == 0xFF:
+                offset += 1
+            if offset + 1 > len(header):
+                return None
+            marker = header[offset]
+            offset += 1
+            if marker in JPEG_STANDALONE_MARKERS:
+                continue
+            if marker == 0xDA:
+                raise ValueError("JPEG has no frame header before its image data")
+            if offset + 2 > len(header):
+                return None
+            (length,) = struct.unpack(">H", header[offset:offset + 2])
+            if marker in JPEG_SOF_MARKERS:
+                if offset + 7 > len(header):
+                    return None
+                height, width = struct.unpack(">HH", header[offset + 3:offset + 7])
+                return ".jpg", width, height
+            offset += length
+            if offset >= len(header):
+                return None
+            if header[offset] != 0xFF:
+                raise ValueError("Malformed JPEG header")
+
+    if len(header) < len(PNG_SIGNATURE) and (PNG_SIGNATURE.startswith(header) or JPEG_SIGNATURE.startswith(header[:3])):
+        return None
+    raise ValueError("Not a PNG or JPEG image")
+
+def check_image_header(header, final=False):
+    """Validate sniffed dimensions; returns (extension, width, height) or None if more bytes are needed.
+
+    Raises HTTPException 400 for non-images and 413 for images with too many pixels.
+    """
+    try:
+        info = sniff_image(header)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)}. Please upload a PNG or JPEG image.")
+    if info is None:
+        if final or len(header) >= UPLOAD_HEADER_BYTES:
+            raise HTTPException(status_code=400, detail="Could not read the image dimensions. Please upload a PNG or JPEG image.")
+        return None
+
+    _, width, height = info
+    if width == 0 or height == 0:
+        raise HTTPException(status_code=400, detail="Image has no pixels")
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise HTTPException(status_code=413, detail=f"Image is too large: {width}x{height} exceeds {UPLOAD_MAX_PIXELS} pixels")
+    return info
+
+def check_image(file_content):
+    """Validate an in-memory image (e.g. a zip entry) by its header; returns (extension, width, height)"""
+    return check_image_header(file_content[:UPLOAD_HEADER_BYTES], final=True)
+
+async def read_upload(file, max_bytes=UPLOAD_MAX_BYTES):
+    """Read an UploadFile in chunks, rejecting it with 413 as soon as it exceeds max_bytes"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File is too large. The limit is {max_bytes // (1024 * 1024)} MB.")
+        chunks.append(chunk)
+
+async def receive_image_upload(file, max_bytes=UPLOAD_MAX_BYTES):
+    """Copy an uploaded image into the blob store while hashing it.
+
+    The form has already been received (its size is capped by UploadSizeLimitMiddleware);
+    the format and dimensions are checked from the first bytes before anything is written,
+    so non-images and decompression bombs are never stored or decoded.
+    Returns (file content, sha256 hex digest, blob key).
+    """
+    chunks = []
+    header = b""
+    info = None
+    size = 0
+    writer = None
+    # Accumulated over the chunks, so each upload is one sample per stage
+    read_time = 0.0
+    write_time = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            read_time += time.perf_counter() - started
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"File is too large. The limit is {max_bytes // (1024 * 1024)} MB.")
+            chunks.append(chunk)
+
+            started = time.perf_counter()
+            if info is None:
+                header = (header + chunk)[:UPLOAD_HEADER_BYTES]
+                info = check_image_header(header)
+                if info is None:
+                    continue
+                # Known to be an image of acceptable size: store what was buffered so far
+                writer = blob_store.open_writer(info[0])
+                for buffered in chunks:
+                    await run_in_threadpool(writer.write, buffered)
+            else:
+                await run_in_threadpool(writer.write, chunk)
+            write_time += time.perf_counter() - started
+
+        if not chunks:
+            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        if info is None:
+            check_image_header(header, final=True)
+
+        started = time.perf_counter()
+        key, content_hash = await run_in_threadpool(writer.commit)
+        write_time += time.perf_counter() - started
+        writer = None
+        observe_stage("upload_read", read_time)
+        observe_stage("blob_write", write_time)
+        return b"".join(chunks), content_hash, key
+    finally:
+        if writer is not None:
+            writer.abort()
+
+class UploadSizeLimitMiddleware:
+    """Caps the request body of the upload endpoints, answering 413 once it is over the limit.
+
+    A Content-Length over the limit is rejected before any of the body is received. Bodies
+    without one (chunked uploads), or that run past it, are cut off as soon as the bytes
+    actually received cross the limit, before the rest is read or spooled to disk.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                body = b'{"detail":"Upload is too large"}'
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the form parser; FastAPI turns it into the 413 response
+                    raise HTTPException(status_code=413, detail="Upload is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
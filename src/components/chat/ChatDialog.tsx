@@ -28,23 +28,49 @@ export function ChatDialog() {
     setIsLoading(true);
 
     try {
-      // Updated to use the correct endpoint path
-      const response = await fetch(`${API_URL}/chat/`, {
+      // Stream the answer so it appears token by token
+      const response = await fetch(`${API_URL}/chat/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ message: input }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Error: ${response.status}`);
       }
 
-      const data = await response.json();
-      setMessages(prev => [...prev, { role: 'assistant', content: data.response }]);
+      setMessages(prev => [...prev, { role: 'assistant', content: '' }]);
+      const appendToAnswer = (content: string) =>
+        setMessages(prev => [
+          ...prev.slice(0, -1),
+          { role: 'assistant', content: prev[prev.length - 1].content + content },
+        ]);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-sent events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+        for (const event of events) {
+          const lines = event.split('\n');
+          const type = lines.find(line => line.startsWith('event:'))?.slice(6).trim();
+          const data = lines.find(line => line.startsWith('data:'))?.slice(5).trim();
+          if (!data) continue;
+          if (type === 'error') throw new Error(JSON.parse(data).detail);
+          if (!type) appendToAnswer(JSON.parse(data).content);
+        }
+      }
     } catch (error) {
       console.error('Error:', error);
       setMessages(prev => [
-        ...prev,
+        // Replace a partial answer rather than leaving it above the error
+        ...prev.filter((message, i) => !(i === prev.length - 1 && message.role === 'assistant')),
         { role: 'assistant', content: 'Sorry, I encountered an error. Please try again.' },
       ]);
     } finally {
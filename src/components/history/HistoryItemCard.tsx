@@ -13,7 +13,8 @@ interface Detection {
 interface HistoryItem {
   id: string;
   image_url: string;
-  image_base64: string;
+  image_urls?: { original: string; medium: string; thumbnail: string };
+  image_base64?: string | null;
   timestamp: string;
   detections: Detection[];
 }
@@ -28,7 +29,7 @@ const HistoryItemCard: React.FC<HistoryItemCardProps> = ({ item, onViewResult })
         <div className="md:w-1/4 p-4 flex items-center justify-center bg-potato-50">
           <div className="relative w-full pt-[100%]">
             <img
-              src={item.image_base64.startsWith('data:image') ? item.image_base64 : item.image_url}
+              src={item.image_base64?.startsWith('data:image') ? item.image_base64 : item.image_urls?.thumbnail ?? item.image_url}
               alt="Potato plant"
               className="absolute inset-0 w-full h-full object-cover rounded-md"
               onError={(e) => {
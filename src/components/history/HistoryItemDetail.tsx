@@ -13,7 +13,8 @@ interface Detection {
 interface HistoryItem {
   id: string;
   image_url: string;
-  image_base64: string;
+  image_urls?: { original: string; medium: string; thumbnail: string };
+  image_base64?: string | null;
   timestamp: string;
   detections: Detection[];
 }
@@ -28,7 +29,7 @@ export const useHistoryItemDetail = () => {
       }
       const detections = Array.isArray(item.detections) ? item.detections : [];
       const resultData = {
-        image: item.image_base64.startsWith('data:image') ? item.image_base64 : item.image_url,
+        image: item.image_base64?.startsWith('data:image') ? item.image_base64 : item.image_url,
         result: {
           detections: detections,
           image_url: item.image_url
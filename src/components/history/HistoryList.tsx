@@ -11,7 +11,8 @@ interface Detection {
 interface HistoryItem {
   id: string;
   image_url: string;
-  image_base64: string;
+  image_urls?: { original: string; medium: string; thumbnail: string };
+  image_base64?: string | null;
   timestamp: string;
   detections: Detection[];
 }
@@ -9,6 +9,7 @@ import HistoryList from "./HistoryList";
 import HistoryFilters from "./HistoryFilters";
 import { useHistoryItemDetail } from "./HistoryItemDetail";
 import { Card, CardContent } from "@/components/ui/card";
+import { Button } from "@/components/ui/button";
 import { API_URL } from "@/config/api";
 
 interface Detection {
@@ -21,7 +22,8 @@ interface Detection {
 interface HistoryItem {
   id: string;
   image_url: string;
-  image_base64: string;
+  image_urls?: { original: string; medium: string; thumbnail: string };
+  image_base64?: string | null;
   timestamp: string;
   detections: Detection[];
 }
@@ -29,7 +31,9 @@ interface HistoryItem {
 const HistoryPageContent: React.FC = () => {
   const [historyItems, setHistoryItems] = useState<HistoryItem[]>([]);
   const [loading, setLoading] = useState(true);
-  const { isLoggedIn, user } = useAuth();
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const { isLoggedIn, user, logout } = useAuth();
   const { viewResult } = useHistoryItemDetail();
 
   useEffect(() => {
@@ -41,14 +45,27 @@ const HistoryPageContent: React.FC = () => {
     // eslint-disable-next-line
   }, [isLoggedIn, user]);
 
+  const fetchHistoryPage = async (cursor?: string | null) => {
+    const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`${API_URL}/history/${user?.username}${params}`, {
+      headers: { Authorization: `Bearer ${user?.token}` },
+    });
+    if (response.status === 401) {
+      // The session token expired or was signed with another secret
+      logout();
+      throw new Error('Session expired');
+    }
+    if (!response.ok) {
+      throw new Error('Failed to fetch history');
+    }
+    return response.json();
+  };
+
   const loadHistory = async () => {
     try {
-      const response = await fetch(`${API_URL}/history/${user?.username}`);
-      if (!response.ok) {
-        throw new Error('Failed to fetch history');
-      }
-      const data = await response.json();
+      const data = await fetchHistoryPage();
       setHistoryItems(data.history);
+      setNextCursor(data.next_cursor ?? null);
     } catch (error) {
       toast({
         title: "Error loading history",
@@ -60,6 +77,24 @@ const HistoryPageContent: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const data = await fetchHistoryPage(nextCursor);
+      setHistoryItems((items) => [...items, ...data.history]);
+      setNextCursor(data.next_cursor ?? null);
+    } catch (error) {
+      toast({
+        title: "Error loading history",
+        description: "Could not load more of your detection history",
+        variant: "destructive",
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Not logged in
   if (!isLoggedIn) {
     return (
@@ -80,7 +115,16 @@ const HistoryPageContent: React.FC = () => {
       ) : historyItems.length === 0 ? (
         <HistoryEmpty />
       ) : (
-        <HistoryList historyItems={historyItems} onViewResult={viewResult} />
+        <>
+          <HistoryList historyItems={historyItems} onViewResult={viewResult} />
+          {nextCursor && (
+            <div className="flex justify-center mt-6">
+              <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+                {loadingMore ? "Loading..." : "Load more"}
+              </Button>
+            </div>
+          )}
+        </>
       )}
     </>
   );
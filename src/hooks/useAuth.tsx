@@ -16,8 +16,14 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     // Check if user is logged in on component mount
     const savedUser = localStorage.getItem('potato_user');
     if (savedUser) {
-      setUser(JSON.parse(savedUser));
-      setIsLoggedIn(true);
+      const parsedUser: User = JSON.parse(savedUser);
+      if (parsedUser.token) {
+        setUser(parsedUser);
+        setIsLoggedIn(true);
+      } else {
+        // Saved before login issued session tokens; log in again to get one
+        localStorage.removeItem('potato_user');
+      }
     }
   }, []);
 
@@ -42,7 +48,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       
       const userData: User = { 
         username: data.username,
-        email: data.email
+        email: data.email,
+        token: data.token
       };
       
       setUser(userData);
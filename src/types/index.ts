@@ -8,6 +8,7 @@ export interface Detection {
 export interface User {
   username: string;
   email: string;
+  token?: string;
 }
 
 export interface AuthState {